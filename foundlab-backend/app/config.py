@@ -17,6 +17,9 @@ class Settings(BaseSettings):
     # Token authentication (NEW!)
     API_AUTH_TOKEN: str = "changeme"
 
+    # Audit log settings: "split" emits request.start + request.end, "fused" emits a single request.end
+    LOG_MODE: str = "split"
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
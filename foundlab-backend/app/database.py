@@ -14,36 +14,7 @@ async def connect_to_mongo():
         client = AsyncIOMotorClient(settings.MONGO_DB_URL)
         await client.admin.command('ping')
         print(f"Connected to MongoDB at {settings.MONGO_DB_URL}")
-
-        # Ensure index on 'entity_id' for scores collection
-        scores_collection = get_collection("scores") # Use get_collection para obter a instância da coleção
-        await scores_collection.create_index([("entity_id", ASCENDING)])
-        print("Ensured index on 'entity_id' for 'scores' collection.")
-
-        # Ensure index on 'name' for flags collection
-        flags_collection = get_collection("flags")
-        await flags_collection.create_index([("name", ASCENDING)], unique=True)
-        print("Ensured index on 'name' for 'flags' collection.")
-
-        # Ensure index on 'entity_id' for sherlock_results collection
-        sherlock_results_collection = get_collection("sherlock_results")
-        await sherlock_results_collection.create_index([("entity_id", ASCENDING)])
-        print("Ensured index on 'entity_id' for 'sherlock_results' collection.")
-
-        # Ensure index on 'name' for risk_triggers collection
-        risk_triggers_collection = get_collection("risk_triggers")
-        await risk_triggers_collection.create_index([("name", ASCENDING)], unique=True) # Assuming trigger names are unique
-        print("Ensured index on 'name' for 'risk_triggers' collection.")
-
-        # Ensure compound index on 'entity_id' and 'created_at' for risk_assessments collection
-        risk_assessments_collection = get_collection("risk_assessments")
-        await risk_assessments_collection.create_index([("entity_id", ASCENDING), ("created_at", DESCENDING)])
-        print("Ensured compound index on 'entity_id' and 'created_at' for 'risk_assessments' collection.")
-
- # Ensure compound index on 'entity_id' and 'timestamp' for gas_records collection
- gas_records_collection = get_collection("gas_records")
- await gas_records_collection.create_index([("entity_id", ASCENDING), ("timestamp", DESCENDING)])
- print("Ensured compound index on 'entity_id' and 'timestamp' for 'gas_records' collection.")
+        await ensure_indexes()
     except ConnectionFailure as e:
         print(f"Could not connect to MongoDB: {e}")
         raise
@@ -52,6 +23,39 @@ async def connect_to_mongo():
         raise
 
 
+async def ensure_indexes():
+    """Creates the indexes the services rely on. create_index is idempotent, so this is safe to call repeatedly."""
+    # Ensure index on 'entity_id' for scores collection
+    scores_collection = get_collection("scores") # Use get_collection para obter a instância da coleção
+    await scores_collection.create_index([("entity_id", ASCENDING)])
+    print("Ensured index on 'entity_id' for 'scores' collection.")
+
+    # Ensure index on 'name' for flags collection
+    flags_collection = get_collection("flags")
+    await flags_collection.create_index([("name", ASCENDING)], unique=True)
+    print("Ensured index on 'name' for 'flags' collection.")
+
+    # Ensure index on 'entity_id' for sherlock_results collection
+    sherlock_results_collection = get_collection("sherlock_results")
+    await sherlock_results_collection.create_index([("entity_id", ASCENDING)])
+    print("Ensured index on 'entity_id' for 'sherlock_results' collection.")
+
+    # Ensure index on 'name' for risk_triggers collection
+    risk_triggers_collection = get_collection("risk_triggers")
+    await risk_triggers_collection.create_index([("name", ASCENDING)], unique=True) # Assuming trigger names are unique
+    print("Ensured index on 'name' for 'risk_triggers' collection.")
+
+    # Ensure compound index on 'entity_id' and 'created_at' for risk_assessments collection
+    risk_assessments_collection = get_collection("risk_assessments")
+    await risk_assessments_collection.create_index([("entity_id", ASCENDING), ("created_at", DESCENDING)])
+    print("Ensured compound index on 'entity_id' and 'created_at' for 'risk_assessments' collection.")
+
+    # Ensure compound index on 'entity_id' and 'timestamp' for gas_records collection
+    gas_records_collection = get_collection("gas_records")
+    await gas_records_collection.create_index([("entity_id", ASCENDING), ("timestamp", DESCENDING)])
+    print("Ensured compound index on 'entity_id' and 'timestamp' for 'gas_records' collection.")
+
+
 async def close_mongo_connection():
     """Closes the MongoDB connection."""
     global client
@@ -12,6 +12,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from prometheus_fastapi_instrumentator import Instrumentator
 
 from app.common.health import router as health_router
+from app import database
 from app.config import settings
 from app.database import close_mongo_connection, connect_to_mongo, get_collection
 from app.routers import (
@@ -65,9 +66,13 @@ class AuthMiddleware(BaseHTTPMiddleware):
 # Conexão e desconexão com o MongoDB
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await connect_to_mongo()
+    # Idempotente: se um cliente já foi injetado (ex.: nos testes), reaproveita-o em vez de abrir um segundo pool.
+    owns_client = database.client is None
+    if owns_client:
+        await connect_to_mongo()
     yield
-    await close_mongo_connection()
+    if owns_client:
+        await close_mongo_connection()
 
 # Instância principal
 app = FastAPI(
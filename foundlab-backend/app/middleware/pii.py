@@ -0,0 +1,30 @@
+import re
+from typing import Any
+
+# Uma única alternação pré-compilada: cada string é varrida uma vez, não uma vez por padrão.
+# Só valores string são mascarados; números do evento (scores, timestamps) nunca passam pelo regex.
+_PII_RE = re.compile(
+    r"(?P<email>[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,})"
+    r"|(?P<card>\b\d{13,19}\b)"
+    r"|(?P<phone>\+\d[\d ()-]{7,}\d)"
+)
+
+
+def _redact(match: re.Match) -> str:
+    return f"[REDACTED:{match.lastgroup}]"
+
+
+def mask(text: str) -> str:
+    """Replaces e-mails, card numbers and phone numbers in ``text`` with ``[REDACTED:<kind>]``."""
+    return _PII_RE.sub(_redact, text)
+
+
+def mask_payload(value: Any) -> Any:
+    """Returns a copy of a JSON-like ``value`` with :func:`mask` applied to every string value (not keys)."""
+    if isinstance(value, str):
+        return mask(value)
+    if isinstance(value, dict):
+        return {key: mask_payload(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [mask_payload(item) for item in value]
+    return value
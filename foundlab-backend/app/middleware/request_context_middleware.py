@@ -1,54 +1,230 @@
+import asyncio
+import atexit
+import contextvars
+import os
+import queue
+import sys
 import time
-import uuid
 import hashlib
-import json
-from starlette.middleware.base import BaseHTTPMiddleware
+import io
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
+from starlette.datastructures import MutableHeaders
 from starlette.requests import Request
-from starlette.responses import Response
-from starlette.types import ASGIApp, Receive, Scope, Send
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import logging
 
+from app.config import settings
+from app.middleware.pii import mask_payload
+
 logger = logging.getLogger("request-context")
 
-class RequestContextMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app: ASGIApp, body_max_len: int = 5000):
-        super().__init__(app)
+# Contexto da requisição: request_id é definido pelo middleware; decision_id e use_case
+# são definidos pela camada de serviço e ficam visíveis para o middleware no request.end.
+# Os defaults são sentinelas internadas: o middleware testa "não definido" por identidade (`is`).
+_DEFAULT_ID = sys.intern("-")
+_DEFAULT_UC = sys.intern("unknown")
+
+request_id_context: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default=_DEFAULT_ID)
+decision_id_context: contextvars.ContextVar[str] = contextvars.ContextVar("decision_id", default=_DEFAULT_ID)
+use_case_context: contextvars.ContextVar[str] = contextvars.ContextVar("use_case", default=_DEFAULT_UC)
+
+# Heartbeat simples: total de requisições HTTP concluídas por este processo
+REQUESTS_PROCESSED_COUNT = 0
+
+
+class JsonBytesStreamHandler(logging.StreamHandler):
+    """Writes audit events as JSON bytes, one write per line, to a binary stream or a text stream's buffer."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        payload = getattr(record, "event_payload", None)
+        text_stream = isinstance(self.stream, io.TextIOBase)
+        buffer = getattr(self.stream, "buffer", None) if text_stream else self.stream
+        if payload is None or buffer is None:
+            super().emit(record)
+            return
+        try:
+            if text_stream:
+                # Esvazia a camada de texto antes para não inverter a ordem com writes feitos via print
+                self.stream.flush()
+            buffer.write(orjson.dumps(payload) + b"\n")
+            buffer.flush()
+        except Exception:
+            self.handleError(record)
+
+
+# Eventos de auditoria saem do caminho da requisição: o handler só enfileira o record
+# e a thread do QueueListener faz a serialização e o write no stdout.
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+audit_logger = logging.getLogger("middleware.audit")
+audit_logger.setLevel(logging.INFO)
+audit_logger.addHandler(QueueHandler(_log_queue))
+
+# Sem formatter: o handler serializa o event_payload direto em bytes
+_stdout_handler = JsonBytesStreamHandler(sys.stdout)
+_audit_listener = QueueListener(_log_queue, _stdout_handler, respect_handler_level=True)
+_audit_listener.start()
+atexit.register(_audit_listener.stop)
+
+# Quantos buffers de corpo cada instância do middleware pré-aloca
+_BUF_POOL_SIZE = 8
+
+# Default compartilhado (somente leitura) quando a requisição não gravou request.state.audit
+_EMPTY_AUDIT: dict = {}
+
+# Schema fixo do request.end com os defaults; cada requisição parte de um .copy() deste template
+_END_EVENT_TEMPLATE: dict = {
+    "event": "request.end",
+    "decision_id": None,
+    "request_id": None,
+    "timestamp": None,
+    "latency_ms": None,
+    "use_case": "undefined",
+    "entity_id": "unknown",
+    "action": None,
+    "score_before": None,
+    "score_after": None,
+    "flags_triggered": (),
+    "status_code": None,
+    "body_truncated": False,
+    "body_size": 0,
+    "actor_ip": None,
+    "actor_agent": None,
+}
+
+
+def _fast_uuid() -> str:
+    """Random UUID4-formatted id built straight from os.urandom, without a uuid.UUID object."""
+    b = bytearray(os.urandom(16))
+    b[6] = (b[6] & 0x0F) | 0x40  # versão 4
+    b[8] = (b[8] & 0x3F) | 0x80  # variante RFC 4122
+    h = b.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+class RequestContextMiddleware:
+    """Pure ASGI middleware that sets the request context and emits the request.start/request.end audit events.
+
+    The downstream app runs in a task bound to a per-request ``contextvars.Context``, so values the
+    endpoint/service sets on ``decision_id_context``/``use_case_context`` are visible here afterwards.
+    """
+
+    def __init__(self, app: ASGIApp, body_max_len: int = 5000, log_mode: str | None = None):
+        self.app = app
         self.body_max_len = body_max_len
+        self.log_mode = log_mode or settings.LOG_MODE
+        # Buffers pré-alocados (body_max_len bytes cada) para o prefixo do corpo, reaproveitados entre requisições
+        self._buf_pool: queue.SimpleQueue[bytearray] = queue.SimpleQueue()
+        for _ in range(_BUF_POOL_SIZE):
+            self._buf_pool.put(bytearray(body_max_len))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-    async def dispatch(self, request: Request, call_next):
         start_time = time.time()
+        request = Request(scope)
 
         # IDs institucionais
-        decision_id = str(uuid.uuid4())
-        # Capture request_id from scope (ASGI server might provide it), fallback to UUID if not
-        request_id = request.scope.get("x-request-id", str(uuid.uuid4()))
+        decision_id = _fast_uuid()
+        # Reuse the caller's X-Request-ID when provided, fallback to a new id if not
+        request_id = request.headers.get("x-request-id") or _fast_uuid()
+
+        # Sem sink de auditoria habilitado nenhum evento é montado: pula captura do corpo, eventos e assinatura
+        audit_enabled = audit_logger.isEnabledFor(logging.INFO)
 
         # Capture body (truncated)
-        # Need to consume body here before call_next if logging it
-        try:
-            body = await request.body()
-            truncated_body = body[:self.body_max_len].decode("utf-8", errors="replace")
-            body_truncated = len(body) > self.body_max_len
-            body_size = len(body)
-        except Exception as e:
-            truncated_body = "<unreadable>"
-            body_truncated = True
-            body_size = 0
-            logger.error(f"Failed to read request body: {e}", extra={"request_id": request_id, "decision_id": decision_id})
+        content_length = request.headers.get("content-length", "")
+        if not audit_enabled:
+            app_receive = receive
+        elif content_length.isdigit() and int(content_length) <= self.body_max_len:
+            # Tamanho declarado e dentro do limite: registra só o tamanho e não toca no receive
+            body_size = int(content_length)
+            body_truncated = False
+            truncated_body = None
+            app_receive = receive
+        else:
+            # Tamanho desconhecido ou acima do limite: lê só até o limite e devolve essas mensagens
+            # ao app antes de repassar o resto do stream intacto
+            buffered: deque[Message] = deque()
+            captured = 0
+            more_body = True
+            try:
+                buf = self._buf_pool.get_nowait()
+                pooled = True
+            except queue.Empty:
+                # Pool vazio sob concorrência: buffer avulso, descartado no fim para o pool não crescer
+                buf = bytearray(self.body_max_len)
+                pooled = False
+            try:
+                while more_body and captured < self.body_max_len:
+                    message = await receive()
+                    buffered.append(message)
+                    if message["type"] != "http.request":
+                        break
+                    chunk = message.get("body", b"")
+                    size = min(len(chunk), self.body_max_len - captured)
+                    buf[captured:captured + size] = memoryview(chunk)[:size]
+                    captured += len(chunk)
+                    more_body = message.get("more_body", False)
+                truncated_body = buf[:min(captured, self.body_max_len)].decode("utf-8", errors="replace")
+                body_size = int(content_length) if content_length.isdigit() else captured
+                body_truncated = more_body or body_size > self.body_max_len
+            except Exception as e:
+                truncated_body = "<unreadable>"
+                body_truncated = True
+                body_size = 0
+                logger.error(f"Failed to read request body: {e}", extra={"request_id": request_id, "decision_id": decision_id})
+            finally:
+                if pooled:
+                    self._buf_pool.put(buf)
 
+            async def app_receive() -> Message:
+                if buffered:
+                    return buffered.popleft()
+                return await receive()
+
+        if audit_enabled:
+            # PII é mascarada nos valores string antes de o evento sair do request path
+            start_event = mask_payload({
+                "event": "request.start",
+                "decision_id": decision_id,
+                "request_id": request_id,
+                "method": request.method,
+                "path": request.url.path,
+                "client": request.client.host if request.client else None,
+                "body_truncated": body_truncated,
+                "body_size": body_size,
+                "truncated_body": truncated_body,
+            })
+            # No modo "fused" o start fica guardado e sai embutido no request.end (um write por requisição)
+            if self.log_mode != "fused":
+                audit_logger.info("request.start", extra={"event_payload": start_event})
 
-        # Re-inject body into request. It's usually not needed if you only read it once,
-        # but if any downstream middleware/endpoint needs the body again, you'd handle it here.
-        # For simple body logging like this, reading it once is fine and usually doesn't
-        # require re-injecting unless other parts of the app rely on request.body().
-        # If you need to re-inject: https://github.com/encode/starlette/issues/1310
-        # For this use case (logging), just consuming the body once here is simpler.
+        status_code = 500 # Default in case of unhandled errors
 
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["x-request-id"] = request_id
+                # Roda dentro do contexto da requisição: só expõe o DecisionID se o serviço o definiu
+                service_decision_id = decision_id_context.get()
+                if service_decision_id is not _DEFAULT_ID:
+                    headers["x-decision-id"] = service_decision_id
+            await send(message)
 
-        response = Response(status_code=500) # Default in case of unhandled errors
+        # Um único Context por requisição, compartilhado (não copiado) com a task do app
+        ctx = contextvars.copy_context()
+        ctx.run(request_id_context.set, request_id)
 
         try:
-            response = await call_next(request)
+            await asyncio.get_running_loop().create_task(self.app(scope, app_receive, send_wrapper), context=ctx)
         except Exception as e:
             # Log unexpected exceptions before re-raising
             logger.error(f"Unhandled exception during request processing: {e}", exc_info=True, extra={
@@ -59,58 +235,54 @@ class RequestContextMiddleware(BaseHTTPMiddleware):
                 "status_code": 500, # Assume 500 for unhandled exceptions
                 "event": "request.exception" # Custom event type
             })
-            # Set status code on response for logging purposes if not already set by exception handler
-            if response.status_code == 500:
-                 response.status_code = 500 # Ensure 500 is captured if no specific handler set it
             raise # Re-raise the exception
 
 
         latency_ms = int((time.time() - start_time) * 1000)
+        global REQUESTS_PROCESSED_COUNT  # noqa: PLW0603 - contador de heartbeat exportado pelo módulo
+        REQUESTS_PROCESSED_COUNT += 1
+        if not audit_enabled:
+            return
+
+        # Scores reputacionais: a aplicação grava um único dict em request.state.audit
+        # (use_case, entity_id, score_before, score_after, flags_triggered); chaves ausentes ficam no default
+        audit = getattr(request.state, "audit", _EMPTY_AUDIT)
 
-        # Scores reputacionais (injected into request.state by the application logic)
-        # Use getattr with a default to avoid errors if the attribute is not set
-        use_case = getattr(request.state, "use_case", "undefined")
-        entity_id = getattr(request.state, "entity_id", "unknown") # Assuming entity_id is stored in state
-        score_before = getattr(request.state, "score_before", None)
-        score_after = getattr(request.state, "score_after", None)
-        flags_triggered = getattr(request.state, "flags_triggered", []) # Assuming stored as list
-
-        # Construct the log event dictionary with the fixed reputational schema
-        log_event = {
-            "decision_id": decision_id,
-            "request_id": request_id,
-            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S.%fZ", time.gmtime()),
-            "latency_ms": latency_ms,
-
-            "use_case": use_case,
-            "entity_id": entity_id,
-            "action": f"{request.method} {request.url.path}",
-
-            "score_before": score_before,
-            "score_after": score_after,
-            "flags_triggered": flags_triggered,
-
-            "status_code": response.status_code,
-            "body_truncated": body_truncated,
-            "body_size": body_size,
-
-            "actor_ip": request.client.host if request.client else None,
-            "actor_agent": request.headers.get("user-agent", "unknown"),
-        }
-
-        # Calculate Veritas signature (SHA256 hash of the sorted JSON log event)
+        # Valores que o endpoint/serviço deixou no contexto da requisição
+        ctx_decision_id = ctx.get(decision_id_context, _DEFAULT_ID)
+        ctx_use_case = ctx.get(use_case_context, _DEFAULT_UC)
+
+        # Construct the log event from the fixed reputational schema
+        log_event = _END_EVENT_TEMPLATE.copy()
+        log_event["decision_id"] = ctx_decision_id if ctx_decision_id is not _DEFAULT_ID else decision_id
+        log_event["request_id"] = request_id
+        log_event["timestamp"] = time.strftime("%Y-%m-%dT%H:%M:%S.%fZ", time.gmtime())
+        log_event["latency_ms"] = latency_ms
+        if ctx_use_case is not _DEFAULT_UC:
+            log_event["use_case"] = ctx_use_case
+        log_event["action"] = f"{request.method} {request.url.path}"
+        log_event["status_code"] = status_code
+        log_event["body_truncated"] = body_truncated
+        log_event["body_size"] = body_size
+        log_event["actor_ip"] = request.client.host if request.client else None
+        log_event["actor_agent"] = request.headers.get("user-agent", "unknown")
+        log_event.update(audit)
+        # Mascara antes de assinar: a assinatura precisa ser verificável a partir da linha emitida
+        log_event = mask_payload(log_event)
+        if self.log_mode == "fused":
+            # O start já foi mascarado ao ser montado; entra depois para não passar pelo regex duas vezes
+            log_event["start"] = start_event
+
+        # Calculate Veritas signature (SHA256 hash of the sorted, masked JSON log event)
         try:
             # Ensure consistent order for hashing
-            log_event_sorted_json = json.dumps(log_event, sort_keys=True, ensure_ascii=False).encode("utf-8")
+            log_event_sorted_json = orjson.dumps(log_event, option=orjson.OPT_SORT_KEYS)
             log_event["veritas_signature"] = hashlib.sha256(log_event_sorted_json).hexdigest()
         except Exception as e:
              logger.error(f"Failed to calculate veritas_signature: {e}", extra={"request_id": request_id, "decision_id": decision_id})
              log_event["veritas_signature"] = "error_calculating_hash"
 
 
-        # Output the JSON log event (to stdout for now)
+        # Output the JSON log event (to stdout via the audit queue for now)
         # In a real scenario, this would go to Kafka, Pub/Sub, etc.
-        print(json.dumps(log_event, ensure_ascii=False))
-
-
-        return response
+        audit_logger.info("request.end", extra={"event_payload": log_event})
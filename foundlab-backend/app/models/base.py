@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Annotated, Optional
+from typing import Annotated, List, Optional
 
 from bson import ObjectId
 from pydantic import BaseModel, Field, BeforeValidator
@@ -23,3 +23,12 @@ class MongoBaseModel(BaseModel):
         "arbitrary_types_allowed": True,
         "json_encoders": {ObjectId: str},
     }
+
+
+class BulkCreateResult(BaseModel):
+    """
+    Outcome of a bulk creation request, keyed by the unique `name` of each document.
+    """
+
+    created: List[str] = Field(default_factory=list, description="Names of the documents that were inserted.")
+    skipped: List[str] = Field(default_factory=list, description="Names that already existed and were skipped.")
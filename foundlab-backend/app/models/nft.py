@@ -1,6 +1,6 @@
 from typing import Dict, List, Optional, Literal
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_serializer
 from pydantic_extra_types.color import Color
 
 
@@ -31,6 +31,11 @@ class SigilMeshNFTMetadata(BaseModel):
         None, description="A URL to a YouTube video for the NFT."
     )
 
+    @field_serializer("background_color")
+    def _serialize_background_color(self, color: Optional[Color]) -> Optional[str]:
+        # Color serializa como nome CSS ("lime") quando existe um; o metadata documenta hex
+        return color.as_hex(format="long").upper() if color else None
+
     model_config = {
         "json_schema_extra": {
             "examples": [
@@ -2,6 +2,7 @@ from typing import List
 
 from fastapi import APIRouter, HTTPException, Path, status, Body
 
+from app.models.base import BulkCreateResult
 from app.models.dfc import (
     DynamicFlagCreate,
     DynamicFlagUpdate,
@@ -29,6 +30,8 @@ async def create_flag_definition(flag_data: DynamicFlagCreate):
                 status_code=status.HTTP_409_CONFLICT, detail=f"Flag '{flag_data.name}' already exists."
             )
         return new_flag
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -36,6 +39,27 @@ async def create_flag_definition(flag_data: DynamicFlagCreate):
         )
 
 
+@router.post(
+    "/definitions:batch",
+    response_model=BulkCreateResult,
+    status_code=status.HTTP_201_CREATED,
+    summary="Create multiple dynamic flag definitions in one request",
+)
+async def create_flag_definitions_batch(flags_data: List[DynamicFlagCreate]):
+    """
+    Creates all flag definitions with a single bulk insert.
+    Flags whose name already exists are reported under `skipped` instead of failing the batch.
+    """
+    dfc_service = DFCService()
+    try:
+        return await dfc_service.create_flag_definitions_bulk([f.model_dump() for f in flags_data])
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create flag definitions: {e}"
+        )
+
+
 @router.get(
     "/definitions",
     response_model=List[FlagDefinition],
@@ -30,6 +30,24 @@ async def ingest_gas_consumption(record: IngestGasConsumptionInput):
         )
 
 
+@router.post(
+    "/ingest/bulk",
+    response_model=List[GasConsumptionRecord],
+    status_code=status.HTTP_201_CREATED,
+    summary="Ingest multiple gas consumption records",
+)
+async def ingest_gas_consumption_bulk(records: List[IngestGasConsumptionInput]):
+    try:
+        gas_monitor_service = GasMonitorService()
+        new_records = await gas_monitor_service.ingest_records([r.model_dump() for r in records])
+        return new_records
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to ingest gas consumption records: {e}",
+        )
+
+
 @router.get(
     "/records/{entity_id}",
     response_model=List[GasConsumptionRecord],
@@ -59,7 +77,7 @@ async def get_records_for_entity(
 )
 async def analyze_gas_patterns(
     entity_id: str,
-    lookback_days: int = Body(7, alias="lookBackDays", ge=1, le=90),
+    lookback_days: int = Body(7, alias="lookBackDays", ge=1, le=90, embed=True),
 ):
     try:
         gas_monitor_service = GasMonitorService()
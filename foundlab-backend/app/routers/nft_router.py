@@ -30,6 +30,8 @@ async def generate_sigilmesh_nft_metadata(input_data: CreateSigilMeshNFTInput =
             input_data.score_id,
             input_data.custom_name,
             input_data.custom_description,
+            input_data.image_url,
+            input_data.background_color,
         )
         return nft_output
     except HTTPException as e:
@@ -2,6 +2,7 @@ from typing import List
 
 from fastapi import APIRouter, HTTPException, Path, status, Body
 
+from app.models.base import BulkCreateResult
 from app.models.risk import (
     CreateRiskTrigger,
     RiskAssessmentInput,
@@ -29,12 +30,34 @@ async def create_risk_trigger(trigger_data: CreateRiskTrigger):
                 status_code=status.HTTP_409_CONFLICT, detail=f"Trigger '{trigger_data.name}' already exists."
             )
         return new_trigger
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to create risk trigger: {e}"
         )
 
 
+@router.post(
+    "/triggers:batch",
+    response_model=BulkCreateResult,
+    status_code=status.HTTP_201_CREATED,
+    summary="Create multiple risk trigger rules in one request",
+)
+async def create_risk_triggers_batch(triggers_data: List[CreateRiskTrigger]):
+    """
+    Creates all risk triggers with a single bulk insert.
+    Triggers whose name already exists are reported under `skipped` instead of failing the batch.
+    """
+    try:
+        sentinela_service = SentinelaService()
+        return await sentinela_service.create_risk_triggers_bulk([t.model_dump() for t in triggers_data])
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to create risk triggers: {e}"
+        )
+
+
 @router.get(
     "/triggers",
     response_model=List[RiskTrigger],
@@ -9,7 +9,7 @@ router = APIRouter()
 
 
 async def get_score_service(request: Request) -> ScoreLabService:
- return ScoreLabService(request=request)
+    return ScoreLabService(request=request)
 
 
 @router.post(
@@ -19,12 +19,14 @@ async def get_score_service(request: Request) -> ScoreLabService:
     summary="Calculate a new reputation score",
     response_description="The calculated reputation score for the entity.",
 )
-async def calculate_score(score_input: ScoreInput):
+async def calculate_score(
+    score_input: ScoreInput,
+    score_service: ScoreLabService = Depends(get_score_service),
+):
     """
     Calculates a new reputation score `P(x)` for a given entity.
     """
     try:
- score_service: ScoreLabService = Depends(get_score_service)
         result = await score_service.calculate_score(score_input)
         return result
     except Exception as e:
@@ -39,12 +41,14 @@ async def calculate_score(score_input: ScoreInput):
     summary="Retrieve a reputation score by ID",
     response_description="The stored reputation score.",
 )
-async def get_score_by_id(score_id: str = Path(..., description="ID of the score to retrieve")):
- """
+async def get_score_by_id(
+    score_id: str = Path(..., description="ID of the score to retrieve"),
+    score_service: ScoreLabService = Depends(get_score_service),
+):
+    """
     Retrieves a previously calculated reputation score by its unique ID.
- """
- score_service: ScoreLabService = Depends(get_score_service)
- score = await score_service.get_score_by_id(score_id)
+    """
+    score = await score_service.get_score_by_id(score_id)
     if not score:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Score not found.")
     return score
@@ -56,9 +60,11 @@ async def get_score_by_id(score_id: str = Path(..., description="ID of the score
     summary="Retrieve all reputation scores for a specific entity",
     response_description="A list of historical reputation scores for the entity.",
 )
-async def get_scores_by_entity(entity_id: str = Path(..., description="ID of the entity to retrieve scores for")):
- """
+async def get_scores_by_entity(
+    entity_id: str = Path(..., description="ID of the entity to retrieve scores for"),
+    score_service: ScoreLabService = Depends(get_score_service),
+):
+    """
     Retrieves all historical reputation scores associated with a specific entity ID.
- """
- score_service: ScoreLabService = Depends(get_score_service)
- return await score_service.get_scores_by_entity_id(entity_id)
+    """
+    return await score_service.get_scores_by_entity_id(entity_id)
@@ -1,4 +1,7 @@
-from fastapi import APIRouter, Body, HTTPException, status
+from typing import AsyncIterator, List, Optional
+
+from fastapi import APIRouter, Body, HTTPException, Path, status
+from fastapi.responses import StreamingResponse
 
 from app.models.sherlock import SherlockValidationInput, SherlockValidationResult
 from app.services.sherlock_service import SherlockService
@@ -22,10 +25,50 @@ async def validate_with_sherlock(input_data: SherlockValidationInput = Body(...)
     """
     sherlock_service = SherlockService()
     try:
-        result = await sherlock_service.validate(input_data)
+        result = await sherlock_service.validate_entity(input_data)
         return result
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to run Sherlock validation: {e}"
         )
+
+
+async def _stream_json_array(
+    first: Optional[SherlockValidationResult], rest: AsyncIterator[SherlockValidationResult]
+) -> AsyncIterator[str]:
+    yield "["
+    if first is not None:
+        yield first.model_dump_json(by_alias=True)
+        async for result in rest:
+            yield "," + result.model_dump_json(by_alias=True)
+    yield "]"
+
+
+@router.get(
+    "/{entity_id}",
+    response_model=List[SherlockValidationResult],
+    summary="Retrieve historical Sherlock validations for an entity",
+    response_description="Validation results for the entity, most recent first.",
+)
+async def get_validation_results_by_entity(
+    entity_id: str = Path(..., description="ID of the entity to retrieve validation results for")
+):
+    """
+    Streams the validation history as a JSON array, serializing each result as it is read
+    from the database cursor instead of materializing the whole history in memory.
+
+    The first result is fetched before the response starts, so query errors still return a 500.
+    Once streaming has begun the status is already sent: a cursor failure mid-stream ends the
+    response with a truncated array. `response_model` only documents the shape in OpenAPI.
+    """
+    sherlock_service = SherlockService()
+    results = sherlock_service.iter_validation_results_by_entity_id(entity_id)
+    try:
+        first = await anext(results, None)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve Sherlock validation results: {e}"
+        )
+    return StreamingResponse(_stream_json_array(first, results), media_type="application/json")
@@ -4,6 +4,7 @@ from fastapi import HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorCollection
 
 from app.database import get_collection
+from app.models.base import BulkCreateResult
 from app.models.dfc import (
     FlagApplicationInput,
     FlagApplyResponse,
@@ -11,6 +12,7 @@ from app.models.dfc import (
     FlagEvaluationResult,
     RuleCondition,
 )
+from app.utils.mongodb_helpers import insert_many_skip_duplicates
 
 
 class DFCService:
@@ -24,6 +26,13 @@ class DFCService:
         new_flag = await self.flags_collection.find_one({"_id": insert_result.inserted_id})
         return FlagDefinition(**new_flag)
 
+    async def create_flag_definitions_bulk(self, flags_data: List[Dict[str, Any]]) -> BulkCreateResult:
+        skipped_indexes = await insert_many_skip_duplicates(self.flags_collection, flags_data)
+        return BulkCreateResult(
+            created=[f["name"] for i, f in enumerate(flags_data) if i not in skipped_indexes],
+            skipped=[f["name"] for i, f in enumerate(flags_data) if i in skipped_indexes],
+        )
+
     async def get_all_flag_definitions(self) -> List[FlagDefinition]:
         flags = []
         async for flag in self.flags_collection.find({}):
@@ -37,7 +46,8 @@ class DFCService:
     async def update_flag_definition(self, name: str, update_data: Dict[str, Any]) -> Optional[FlagDefinition]:
         update_data.pop("name", None)
         update_result = await self.flags_collection.update_one({"name": name}, {"$set": update_data})
-        if update_result.modified_count == 0:
+        # matched_count, não modified_count: um update sem mudanças ainda encontrou a flag
+        if update_result.matched_count == 0:
             return None
         updated_flag = await self.flags_collection.find_one({"name": name})
         return FlagDefinition(**updated_flag) if updated_flag else None
@@ -88,12 +98,13 @@ class DFCService:
                 if self._evaluate_rule(rule.model_dump(), metadata):
                     is_active = True
                     reason = f"Rule '{rule.field} {rule.condition} {rule.value}' matched."
-                    flag_value = True if flag_def.type == "boolean" else metadata.get(rule["field"], flag_def.default_value)
+                    flag_value = True if flag_def.type == "boolean" else metadata.get(rule.field, flag_def.default_value)
                     break
 
             if not flag_def.rules and flag_def.default_value is not None:
                 is_active = True
                 flag_value = flag_def.default_value
+                reason = "No rules defined for dynamic evaluation, using default value."
 
             evaluated_results.append(
                 FlagEvaluationResult(
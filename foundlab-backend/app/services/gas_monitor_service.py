@@ -28,6 +28,13 @@ class GasMonitorService:
         new_record = await self.gas_records_collection.find_one({"_id": insert_result.inserted_id})
         return GasConsumptionRecord(**new_record)
 
+    async def ingest_records(self, records_data: List[Dict[str, Any]]) -> List[GasConsumptionRecord]:
+        if not records_data:
+            return []
+        # insert_many preenche o _id de cada dict, então não é preciso reler os documentos inseridos.
+        await self.gas_records_collection.insert_many(records_data)
+        return [GasConsumptionRecord(**record) for record in records_data]
+
     async def get_records_by_entity(self, entity_id: str, limit: int = 10, skip: int = 0) -> List[GasConsumptionRecord]:
         records = []
         cursor = self.gas_records_collection.find({"entity_id": entity_id}).sort("timestamp", -1).skip(skip).limit(limit)
@@ -5,12 +5,14 @@ from fastapi import HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorCollection
 
 from app.database import get_collection
+from app.models.base import BulkCreateResult
 from app.models.risk import (
     RiskAssessmentResult,
     RiskLevel,
     RiskTrigger,
     RiskTriggerDetail,
 )
+from app.utils.mongodb_helpers import insert_many_skip_duplicates
 
 
 class SentinelaService:
@@ -30,6 +32,18 @@ class SentinelaService:
         new_trigger = await self.risk_triggers_collection.find_one({"_id": insert_result.inserted_id})
         return RiskTrigger(**new_trigger)
 
+    async def create_risk_triggers_bulk(self, triggers_data: List[Dict[str, Any]]) -> BulkCreateResult:
+        now = datetime.utcnow()
+        for trigger_data in triggers_data:
+            trigger_data["created_at"] = now
+            trigger_data["updated_at"] = now
+
+        skipped_indexes = await insert_many_skip_duplicates(self.risk_triggers_collection, triggers_data)
+        return BulkCreateResult(
+            created=[t["name"] for i, t in enumerate(triggers_data) if i not in skipped_indexes],
+            skipped=[t["name"] for i, t in enumerate(triggers_data) if i in skipped_indexes],
+        )
+
     async def get_all_risk_triggers(self) -> List[RiskTrigger]:
         triggers = []
         async for trigger in self.risk_triggers_collection.find({"is_active": True}):
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Any, Dict, List, Optional
 
 from fastapi import HTTPException, status, Request
@@ -10,7 +11,8 @@ from app.middleware.request_context_middleware import use_case_context
 
 
 class ScoreLabService:
-    def __init__(self, request: Request):
+    def __init__(self, request: Optional[Request] = None):
+        # Só calculate_score grava auditoria em request.state; leituras (Sentinela, SigilMesh) não passam request
         self.request = request
         self.score_repository = ScoreRepository()
 
@@ -21,21 +23,26 @@ class ScoreLabService:
         The full list of flags provided in `score_input` (active and inactive) is stored.
         The calculated score result is stored in the database.
         """
-        self.score_calculator = ScoreCalculator() # Instantiate calculator here as needed\n
+        self.score_calculator = ScoreCalculator() # Instantiate calculator here as needed
+
         # --- Definir UseCase no contexto e injetar dados no request.state ---
         use_case_token = use_case_context.set("recalibrate_score") # Setar o use case no contexto
 
         # Injetar dados no request.state antes da chamada ao call_next no middleware
         # Para este exemplo, score_before será None na primeira execução
         # score_after será o score calculado
-        self.request.state.score_before = None # Buscar score_before real se necessário
-        self.request.state.flags_triggered = [f.model_dump() for f in score_input.flags if f.is_active] # Exemplo: flags ativas
+        self.request.state.audit = {
+            "score_before": None, # Buscar score_before real se necessário
+            "flags_triggered": [f.model_dump() for f in score_input.flags if f.is_active], # Exemplo: flags ativas
+        }
         active_flags = [f for f in score_input.flags if f.is_active]
 
         raw_score, probability_score = self.score_calculator.calculate_p_x(
             active_flags, score_input.metadata
         )
 
+        # created_at precisa ir para o banco: get_by_entity_id ordena por ele
+        now = datetime.utcnow()
         score_data = {
             "entity_id": score_input.entity_id,
             "probability_score": probability_score,
@@ -44,12 +51,14 @@ class ScoreLabService:
             "flags_used": [f.model_dump() for f in score_input.flags],
             "metadata_used": score_input.metadata,
             "summary": f"Reputation score for {score_input.entity_id} is {probability_score:.4f}.",
+            "created_at": now,
+            "updated_at": now,
         }
 
         new_score_doc = await self.score_repository.create(score_data)
 
         # --- Injetar score_after no request.state ---
-        self.request.state.score_after = probability_score
+        self.request.state.audit["score_after"] = probability_score
         # --------------------------------------------
 
         # Resetar use_case_context ao sair do escopo deste caso de uso
@@ -72,6 +81,7 @@ class ScoreLabService:
         score = await self.score_repository.get_by_id(_id_obj)
         use_case_context.reset(use_case_token)
         return ScoreResult(**score) if score else None
+
     async def get_scores_by_entity_id(self, entity_id: str) -> List[ScoreResult]:
         """Retrieves all historical scores for a given entity, ordered by most recent first."""
         # --- Definir UseCase no contexto para logs de busca ---
@@ -80,4 +90,4 @@ class ScoreLabService:
         # ------------------------------------------------------
         score_docs = await self.score_repository.get_by_entity_id(entity_id)
         use_case_context.reset(use_case_token)
-        return [ScoreResult(**doc) for doc in score_docs]\n
+        return [ScoreResult(**doc) for doc in score_docs]
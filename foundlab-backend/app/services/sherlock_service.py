@@ -1,8 +1,9 @@
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 from fastapi import HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pydantic import TypeAdapter
 
 from app.database import get_collection
 from app.models.sherlock import (
@@ -14,35 +15,71 @@ from app.models.sherlock import (
     SherlockValidationResult,
 )
 
+# Nomes de flags emitidos pelos provedores, agrupados pela classificação que disparam.
+# Equivalente ao antigo teste por substring ("sanction"/"cft" e "pep"/"watchlist" no flag_name):
+# OFAC_SDN_Match não contém nenhum dos termos e segue classificado só pelo score.
+SANCTION_FLAG_NAMES = frozenset({"Global_Sanctions_Match", "CFT_List_Match"})
+PEP_WATCHLIST_FLAG_NAMES = frozenset({"PEP_Exposure"})
+HIGH_RISK_FLAG_CATEGORIES = frozenset({"AML", "Illicit Activities"})
+
+HIGH_RISK_SCORE_THRESHOLD = 0.7
+MAX_RISK_SCORE = 1.0
+
+# Política de decisão: (SanctionStatus, suggested_action) indexado pela máscara de 4 bits
+# sanção/CFT << 3 | PEP/watchlist << 2 | AML/ilícito de alto risco << 1 | risk_score >= 0.7
+_DECISION_TABLE = {
+    0b0000: (SanctionStatus.CLEAN, "proceed"),
+    0b0001: (SanctionStatus.HIGH_RISK, "review_manual"),
+    0b0010: (SanctionStatus.HIGH_RISK, "review_manual"),
+    0b0011: (SanctionStatus.HIGH_RISK, "review_manual"),
+    0b0100: (SanctionStatus.HIGH_RISK, "review_manual"),
+    0b0101: (SanctionStatus.HIGH_RISK, "review_manual"),
+    0b0110: (SanctionStatus.HIGH_RISK, "review_manual"),
+    0b0111: (SanctionStatus.HIGH_RISK, "review_manual"),
+    0b1000: (SanctionStatus.SANCTIONED, "block"),
+    0b1001: (SanctionStatus.SANCTIONED, "block"),
+    0b1010: (SanctionStatus.SANCTIONED, "block"),
+    0b1011: (SanctionStatus.SANCTIONED, "block"),
+    0b1100: (SanctionStatus.SANCTIONED, "block"),
+    0b1101: (SanctionStatus.SANCTIONED, "block"),
+    0b1110: (SanctionStatus.SANCTIONED, "block"),
+    0b1111: (SanctionStatus.SANCTIONED, "block"),
+}
+# Com um provedor pendente e nenhuma flag decisiva, o resultado fica inconclusivo.
+_PENDING_DECISION = (SanctionStatus.UNKNOWN, "review_manual")
+
+# Serializador construído uma única vez e reutilizado na persistência de cada validação.
+_RESULT_ADAPTER = TypeAdapter(SherlockValidationResult)
+
 
 class SherlockService:
     def __init__(self):
         self.validation_results_collection: AsyncIOMotorCollection = get_collection("sherlock_results")
 
-    async def _mock_chainalysis_check(self, entity_id: str, entity_type: str) -> ExternalProviderResult:
+    async def _mock_chainalysis_check(self, entity_id: str, entity_id_lower: str, entity_type: str) -> ExternalProviderResult:
         flags: List[ComplianceFlag] = []
         score = 0.1
         status_val = ProviderStatus.SUCCESS
         message = "No significant issues found by Chainalysis."
 
-        if "sanctioned_entity" in entity_id.lower() or "ofac_test" in entity_id.lower():
+        if "sanctioned_entity" in entity_id_lower or "ofac_test" in entity_id_lower:
             flags.append(ComplianceFlag(flag_name="OFAC_SDN_Match", category="Sanctions", value="Direct hit", severity=1.0))
             score = 1.0
             message = "Entity directly linked to OFAC SDN list."
-        elif "dark_market_exposure" in entity_id.lower():
+        elif "dark_market_exposure" in entity_id_lower:
             flags.append(ComplianceFlag(flag_name="Dark_Market_Involvement", category="Illicit Activities", value="Indirect exposure", severity=0.85))
             flags.append(ComplianceFlag(flag_name="High_Risk_DEX_Usage", category="DeFi & Exchanges", value="Extensive DEX only activity", severity=0.6))
             score = 0.85
             message = "Entity has exposure to dark market transactions."
-        elif "high_volume_gambling" in entity_id.lower():
+        elif "high_volume_gambling" in entity_id_lower:
             flags.append(ComplianceFlag(flag_name="High_Intensity_Gambling", category="AML", value="Frequent large transfers to gambling sites", severity=0.7))
             score = 0.7
             message = "High volume of transactions with known gambling services."
-        elif "under_investigation" in entity_id.lower():
+        elif "under_investigation" in entity_id_lower:
             status_val = ProviderStatus.PENDING
             message = "Entity is currently under investigation, manual review required."
             score = 0.5
-        elif "mixer_usage" in entity_id.lower():
+        elif "mixer_usage" in entity_id_lower:
             flags.append(ComplianceFlag(flag_name="Crypto_Mixer_Usage", category="Privacy Enhancing", value="Observed interaction with CoinJoin/mixers", severity=0.75))
             score = 0.75
             message = "Transaction history includes interaction with cryptocurrency mixers."
@@ -55,25 +92,25 @@ class SherlockService:
             message=message,
         )
 
-    async def _mock_trm_labs_check(self, entity_id: str, entity_type: str) -> ExternalProviderResult:
+    async def _mock_trm_labs_check(self, entity_id: str, entity_id_lower: str, entity_type: str) -> ExternalProviderResult:
         flags: List[ComplianceFlag] = []
         score = 0.05
         status_val = ProviderStatus.SUCCESS
         message = "No red flags from TRM Labs."
 
-        if "terror_finance_org" in entity_id.lower() or "cft_listed" in entity_id.lower():
+        if "terror_finance_org" in entity_id_lower or "cft_listed" in entity_id_lower:
             flags.append(ComplianceFlag(flag_name="CFT_List_Match", category="Terrorist Financing", value="Match on CFT watchlist", severity=0.98))
             score = 0.98
             message = "Entity found on Counter-Terrorism Financing watchlist."
-        elif "pep_exposed" in entity_id.lower():
+        elif "pep_exposed" in entity_id_lower:
             flags.append(ComplianceFlag(flag_name="PEP_Exposure", category="AML", value="Politically Exposed Person", severity=0.6))
             score = 0.6
             message = "Entity flagged as Politically Exposed Person."
-        elif "sanctioned_entity" in entity_id.lower():
+        elif "sanctioned_entity" in entity_id_lower:
             flags.append(ComplianceFlag(flag_name="Global_Sanctions_Match", category="Sanctions", value="International sanctions list", severity=0.95))
             score = 0.95
             message = "Entity found on global sanctions lists."
-        elif "high_risk_jurisdiction" in entity_id.lower():
+        elif "high_risk_jurisdiction" in entity_id_lower:
             flags.append(ComplianceFlag(flag_name="High_Risk_Jurisdiction_Link", category="Geographic Risk", value="Tied to known high-risk region", severity=0.8))
             score = 0.8
             message = "Entity linked to a high-risk jurisdiction."
@@ -89,14 +126,17 @@ class SherlockService:
     async def validate_entity(self, validation_input: SherlockValidationInput) -> SherlockValidationResult:
         provider_results: List[ExternalProviderResult] = []
 
-        chainalysis_result = await self._mock_chainalysis_check(validation_input.entity_id, validation_input.entity_type)
+        entity_id = validation_input.entity_id
+        entity_id_lower = entity_id.lower()
+
+        chainalysis_result = await self._mock_chainalysis_check(entity_id, entity_id_lower, validation_input.entity_type)
         provider_results.append(chainalysis_result)
 
-        trm_labs_result = await self._mock_trm_labs_check(validation_input.entity_id, validation_input.entity_type)
+        trm_labs_result = await self._mock_trm_labs_check(entity_id, entity_id_lower, validation_input.entity_type)
         provider_results.append(trm_labs_result)
 
         overall_risk_score = 0.0
-        overall_sanction_status = SanctionStatus.UNKNOWN if any(res.status == ProviderStatus.PENDING for res in provider_results) else SanctionStatus.CLEAN
+        provider_pending = any(res.status == ProviderStatus.PENDING for res in provider_results)
         sherlock_flags: List[ComplianceFlag] = []
 
         sanction_or_cft_flag_detected = False
@@ -104,31 +144,41 @@ class SherlockService:
         high_risk_aml_or_illicit_detected = False
 
         for res in provider_results:
-            if res.status == ProviderStatus.SUCCESS:
-                if res.score is not None:
-                    overall_risk_score = max(overall_risk_score, res.score)
-
-                for flag in res.flags:
-                    sherlock_flags.append(flag)
-                    if "sanction" in flag.flag_name.lower() or "cft" in flag.flag_name.lower():
-                        sanction_or_cft_flag_detected = True
-                    if "pep" in flag.flag_name.lower() or "watchlist" in flag.flag_name.lower():
-                        pep_or_watchlist_flag_detected = True
-                    if flag.category in ["AML", "Illicit Activities"] and flag.severity >= 0.7:
-                        high_risk_aml_or_illicit_detected = True
-
-        if sanction_or_cft_flag_detected:
-            overall_sanction_status = SanctionStatus.SANCTIONED
-        elif pep_or_watchlist_flag_detected or high_risk_aml_or_illicit_detected:
-            overall_sanction_status = SanctionStatus.HIGH_RISK
-        elif overall_sanction_status == SanctionStatus.CLEAN and overall_risk_score >= 0.7:
-            overall_sanction_status = SanctionStatus.HIGH_RISK
-
-        suggested_action = "proceed"
-        if overall_sanction_status == SanctionStatus.SANCTIONED:
-            suggested_action = "block"
-        elif overall_sanction_status in [SanctionStatus.HIGH_RISK, SanctionStatus.UNKNOWN]:
-            suggested_action = "review_manual"
+            if res.status != ProviderStatus.SUCCESS:
+                continue
+
+            # As flags são sempre coletadas para o registro, mesmo com o resultado já decidido.
+            sherlock_flags.extend(res.flags)
+            if sanction_or_cft_flag_detected and overall_risk_score >= MAX_RISK_SCORE:
+                # SANCTIONED/block e score saturado: nenhum provedor restante altera o resultado.
+                continue
+
+            if res.score is not None:
+                overall_risk_score = max(overall_risk_score, res.score)
+
+            if sanction_or_cft_flag_detected:
+                # SANCTIONED já está decidido; as demais classificações não alteram o resultado.
+                continue
+
+            for flag in res.flags:
+                if flag.flag_name in SANCTION_FLAG_NAMES:
+                    sanction_or_cft_flag_detected = True
+                    break
+                if flag.flag_name in PEP_WATCHLIST_FLAG_NAMES:
+                    pep_or_watchlist_flag_detected = True
+                if flag.category in HIGH_RISK_FLAG_CATEGORIES and flag.severity >= 0.7:
+                    high_risk_aml_or_illicit_detected = True
+
+        decision_key = (
+            (sanction_or_cft_flag_detected << 3)
+            | (pep_or_watchlist_flag_detected << 2)
+            | (high_risk_aml_or_illicit_detected << 1)
+            | (overall_risk_score >= HIGH_RISK_SCORE_THRESHOLD)
+        )
+        if provider_pending and decision_key < 0b0010:
+            overall_sanction_status, suggested_action = _PENDING_DECISION
+        else:
+            overall_sanction_status, suggested_action = _DECISION_TABLE[decision_key]
 
         result = SherlockValidationResult(
             entity_id=validation_input.entity_id,
@@ -140,7 +190,9 @@ class SherlockService:
             suggested_action=suggested_action,
         )
 
-        inserted_result = await self.validation_results_collection.insert_one(result.model_dump(by_alias=True))
+        inserted_result = await self.validation_results_collection.insert_one(
+            _RESULT_ADAPTER.dump_python(result, by_alias=True, mode="python", exclude={"id"})
+        )
         if not inserted_result.inserted_id:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -150,9 +202,8 @@ class SherlockService:
         new_result = await self.validation_results_collection.find_one({"_id": inserted_result.inserted_id})
         return SherlockValidationResult(**new_result)
 
-    async def get_validation_results_by_entity_id(self, entity_id: str) -> List[SherlockValidationResult]:
-        results = []
-        cursor = self.validation_results_collection.find({"entity_id": entity_id}).sort("created_at", -1)
+    async def iter_validation_results_by_entity_id(self, entity_id: str) -> AsyncIterator[SherlockValidationResult]:
+        # batch_size vai como kwarg do find(): o mongomock-motor não envolve Cursor.batch_size().
+        cursor = self.validation_results_collection.find({"entity_id": entity_id}, batch_size=200).sort("created_at", -1)
         async for result_doc in cursor:
-            results.append(SherlockValidationResult(**result_doc))
-        return results
+            yield SherlockValidationResult(**result_doc)
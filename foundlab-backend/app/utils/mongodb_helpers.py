@@ -1,4 +1,10 @@
+from typing import Any, Dict, List, Set
+
 from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import BulkWriteError
+
+DUPLICATE_KEY_ERROR_CODE = 11000
 
 
 class PyObjectId(str):
@@ -15,3 +21,24 @@ class PyObjectId(str):
         if not ObjectId.is_valid(v):
             raise ValueError("Invalid ObjectId")
         return str(v)
+
+
+async def insert_many_skip_duplicates(collection: AsyncIOMotorCollection, documents: List[Dict[str, Any]]) -> Set[int]:
+    """
+    Inserts all documents in a single unordered bulk write.
+
+    Documents rejected by a unique index (E11000) are skipped instead of aborting the batch.
+    Returns the indexes of the skipped documents; any other write error is re-raised.
+    """
+    if not documents:
+        return set()
+    try:
+        await collection.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        if e.details.get("writeConcernErrors") or any(
+            err.get("code") != DUPLICATE_KEY_ERROR_CODE for err in write_errors
+        ):
+            raise
+        return {err["index"] for err in write_errors}
+    return set()
@@ -1,8 +1,15 @@
 #!/usr/bin/env python3
+import json
 import os
+import re
 import subprocess
+from pathlib import Path
+
 from dotenv import load_dotenv
 
+API_URL_LINE = re.compile(r"^\s*API_URL=")
+
+
 def run_command(command_parts: list, check: bool = True, capture_output: bool = True):
     command_str = " ".join(command_parts)
     print(f"Executing: {command_str}")
@@ -73,27 +80,33 @@ async def main():
         "--max-instances", "1",
         "--cpu", "1",
         "--memory", "512Mi",
-        "--timeout", "300s"
+        "--timeout", "300s",
+        "--format", "json"
     ]
     print("--- Deploying service to Cloud Run ---")
     deploy_output = run_command(deploy_command_parts)
 
-    service_url_line = [line for line in deploy_output.splitlines() if "Service URL:" in line]
     service_url = None
-    if service_url_line:
-        service_url = service_url_line[0].split("Service URL:")[1].strip()
+    try:
+        service_url = json.loads(deploy_output)["status"]["url"]
+    except (json.JSONDecodeError, KeyError, TypeError):
+        pass
+
+    if service_url:
         print(f"Deployment successful! 🚀")
         print(f"Your FoundLab Backend is available at: {service_url}")
         print(f"Swagger UI: {service_url}/docs")
         print(f"ReDoc: {service_url}/redoc")
 
-        with open(".env", "r") as f:
-            lines = f.readlines()
-        with open(".env", "w") as f:
-            for line in lines:
-                if not line.strip().startswith("API_URL="):
-                    f.write(line)
-            f.write(f'API_URL="{service_url}"\n')
+        env_path = Path(".env")
+        lines = [line for line in env_path.read_text().splitlines(keepends=True) if not API_URL_LINE.match(line)]
+        if lines and not lines[-1].endswith("\n"):
+            lines[-1] += "\n"
+        lines.append(f'API_URL="{service_url}"\n')
+        # Escreve num arquivo temporário e troca atomicamente, para nunca deixar o .env truncado.
+        tmp_path = env_path.with_name(env_path.name + ".tmp")
+        tmp_path.write_text("".join(lines))
+        os.replace(tmp_path, env_path)
         print(f"Updated local .env file with API_URL={service_url} for next steps (init/Postman).")
         print("Please import the 'foundlab_collection.json' into Postman and ensure 'baseUrl' variable is set to this URL.")
     else:
@@ -4,6 +4,22 @@ import os
 import httpx
 from dotenv import load_dotenv
 
+async def _post_batch(client: httpx.AsyncClient, path: str, kind: str, items: list):
+    """Creates all items with one batch request; names that already exist are reported as skipped."""
+    try:
+        response = await client.post(path, json=items)
+        response.raise_for_status()
+        result = response.json()
+        for name in result["created"]:
+            print(f"  {kind} '{name}' created successfully.")
+        for name in result["skipped"]:
+            print(f"  {kind} '{name}' already exists, skipping creation.")
+    except httpx.HTTPStatusError as e:
+        print(f"  Failed to create {kind.lower()}s: {e.response.text}")
+    except httpx.RequestError as e:
+        print(f"  Network error creating {kind.lower()}s: {e}")
+
+
 async def main():
     load_dotenv()
     BASE_URL = os.getenv("API_URL", "http://localhost:8000")
@@ -66,18 +82,7 @@ async def main():
             }
         ]
 
-        for flag_data in default_flags:
-            try:
-                response = await client.post("/flags/definitions", json=flag_data)
-                response.raise_for_status()
-                print(f"  Flag '{flag_data['name']}' created successfully (or already exists).")
-            except httpx.HTTPStatusError as e:
-                if e.response.status_code == 409:
-                    print(f"  Flag '{flag_data['name']}' already exists, skipping creation.")
-                else:
-                    print(f"  Failed to create flag '{flag_data['name']}': {e.response.text}")
-            except httpx.RequestError as e:
-                print(f"  Network error creating flag '{flag_data['name']}': {e}")
+        await _post_batch(client, "/flags/definitions:batch", "Flag", default_flags)
 
         print("--- Initializing Default Risk Triggers ---")
         default_triggers = [
@@ -115,18 +120,7 @@ async def main():
             }
         ]
 
-        for trigger_data in default_triggers:
-            try:
-                response = await client.post("/sentinela/triggers", json=trigger_data)
-                response.raise_for_status()
-                print(f"  Trigger '{trigger_data['name']}' created successfully (or already exists).")
-            except httpx.HTTPStatusError as e:
-                if e.response.status_code == 409:
-                    print(f"  Trigger '{trigger_data['name']}' already exists, skipping creation.")
-                else:
-                    print(f"  Failed to create trigger '{trigger_data['name']}': {e.response.text}")
-            except httpx.RequestError as e:
-                print(f"  Network error creating trigger '{trigger_data['name']}': {e}")
+        await _post_batch(client, "/sentinela/triggers:batch", "Trigger", default_triggers)
 
     print("--- FoundLab Backend Data Initialization COMPLETE ---")
     print("Remember to configure your MongoDB connection string in .env.")
@@ -0,0 +1,13 @@
+"""Cheap random identifiers for test fixtures (no Faker provider overhead)."""
+import secrets
+import uuid
+
+
+def rand_id() -> str:
+    """Opaque unique id (32 hex chars)."""
+    return uuid.uuid4().hex
+
+
+def rand_hash() -> str:
+    """Random 64-hex-char digest, shaped like a transaction hash."""
+    return secrets.token_hex(32)
@@ -1,20 +1,39 @@
 import asyncio
+import logging
+import os
+import random
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import AsyncGenerator, Dict, List
+from typing import Any, AsyncGenerator, Dict, List, Optional
 
 import pytest
 import pytest_asyncio
 from faker import Faker
-from httpx import AsyncClient
+from httpx import ASGITransport, AsyncClient, Response
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo_inmemory import MongoClient as InMemoryMongoClient
+from pydantic import TypeAdapter
 
+from app.config import settings
 from app.main import app
-from app.models.dfc import FlagDefinition, FlagType, Rule, RuleCondition
-from app.models.gas_monitor import GasConsumptionRecord
-from app.models.risk import RiskLevel, RiskTrigger
+from app.models.dfc import DynamicFlagCreate, FlagDefinition, FlagType, Rule, RuleCondition
+from app.models.gas_monitor import GasConsumptionRecord, IngestGasConsumptionInput
+from app.models.risk import CreateRiskTrigger, RiskLevel, RiskTrigger
 from app.models.score import FlagWithValue, ScoreResult
 from app.models.sherlock import SherlockValidationResult
+from app.services.dfc_service import DFCService
+from app.services.gas_monitor_service import GasMonitorService
+from app.services.risk_service import SentinelaService
+from tests._ids import rand_hash, rand_id
+
+logger = logging.getLogger(__name__)
+
+# Adapters construídos uma vez: validate_json vai direto de bytes para o modelo, sem passar por dict.
+_FlagAdapter = TypeAdapter(FlagDefinition)
+_ScoreAdapter = TypeAdapter(ScoreResult)
+_TriggerAdapter = TypeAdapter(RiskTrigger)
+_SherlockAdapter = TypeAdapter(SherlockValidationResult)
+_GasAdapter = TypeAdapter(GasConsumptionRecord)
+_GasListAdapter = TypeAdapter(List[GasConsumptionRecord])
 
 
 @pytest_asyncio.fixture(scope="session")
@@ -22,178 +41,370 @@ def anyio_backend():
     return "asyncio"
 
 
+# Backend do banco de testes: "mock" (mongomock-motor, em processo) ou "inmemory" (mongod real via pymongo-inmemory).
+TEST_BACKEND = os.environ.get("TEST_BACKEND", "mock")
+
+# URI of the single in-memory mongod shared by the whole run (and by every xdist worker).
+TEST_MONGO_URI_ENV = "FOUNDLAB_TEST_MONGO_URI"
+
+
+def pytest_configure(config):
+    """
+    Starts one in-memory MongoDB process for the whole pytest run when TEST_BACKEND=inmemory.
+    Under pytest-xdist this runs only in the controller; workers inherit the URI through the environment.
+    Setting FOUNDLAB_TEST_MONGO_URI beforehand points the suite at an externally managed mongod instead.
+    """
+    if TEST_BACKEND != "inmemory" or hasattr(config, "workerinput") or os.environ.get(TEST_MONGO_URI_ENV):
+        return
+    from pymongo_inmemory import MongoClient as InMemoryMongoClient
+
+    logger.debug("Starting in-memory MongoDB for tests")
+    config.inmemory_mongo = InMemoryMongoClient()
+    os.environ[TEST_MONGO_URI_ENV] = config.inmemory_mongo.connection_string
+
+
+def pytest_unconfigure(config):
+    inmemory_mongo = getattr(config, "inmemory_mongo", None)
+    if inmemory_mongo is not None:
+        logger.debug("Stopping in-memory MongoDB")
+        inmemory_mongo.close()
+        os.environ.pop(TEST_MONGO_URI_ENV, None)
+
+
 @pytest_asyncio.fixture(scope="session")
 async def mongo_client_fixture() -> AsyncGenerator[AsyncIOMotorClient, None]:
     """
-    Fixture for an in-memory MongoDB client for testing.
-    This creates a real MongoDB process in memory.
+    Fixture for the test Motor client.
+    By default an in-process mongomock-motor client (no socket, no BSON round-trip);
+    TEST_BACKEND=inmemory connects to the shared in-memory mongod for real server semantics.
+    Each xdist worker gets its own database so workers never clear each other's data.
     """
-    client = InMemoryMongoClient()
-    motor_client = AsyncIOMotorClient(client.connection_string)
+    worker_id = os.environ.get("PYTEST_XDIST_WORKER")
+    if worker_id:
+        settings.MONGO_DB_NAME = f"foundlab_db_{worker_id}"
+
+    if TEST_BACKEND == "inmemory":
+        # Os testes rodam em um único worker por processo; um pool pequeno basta.
+        motor_client = AsyncIOMotorClient(os.environ[TEST_MONGO_URI_ENV], maxPoolSize=5, minPoolSize=1)
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        motor_client = AsyncMongoMockClient()
 
     from app import database
     database.client = motor_client
 
-    print("--- Starting in-memory MongoDB for tests ---")
     yield motor_client
-    print("--- Stopping in-memory MongoDB ---")
     motor_client.close()
-    client.close()
 
 
-@pytest_asyncio.fixture(autouse=True)
-async def clear_database(mongo_client_fixture: AsyncIOMotorClient):
+@pytest_asyncio.fixture(scope="session")
+async def _ensure_indexes(mongo_client_fixture: AsyncIOMotorClient):
+    """
+    Creates the application indexes once per session, on first use by a Mongo-backed fixture.
+    clear_database only empties collections, so the indexes survive between tests.
+    """
+    from app import database
+    await database.ensure_indexes()
+
+
+@pytest_asyncio.fixture
+async def clear_database(mongo_client_fixture: AsyncIOMotorClient, _ensure_indexes):
     """
     Clears all collections in the test database before each test.
-    Ensures test isolation.
+    Ensures test isolation. Test modules that write data opt in with
+    `pytestmark = pytest.mark.usefixtures("clear_database")`; read-only modules skip it.
+    Services are not rebuilt here: routers instantiate them per request on top of the
+    shared Motor client, so there is no per-test service state to reset.
     """
-    db = mongo_client_fixture["foundlab_db"]
-    for collection_name in await db.list_collection_names():
-        if collection_name.startswith("system."):
-            continue
-        await db.drop_collection(collection_name)
-    print(f"Cleared database: {db.name}")
-
-    from app.services.score_service import ScoreLabService
-    from app.services.dfc_service import DFCService
-    from app.services.sherlock_service import SherlockService
-    from app.services.nft_service import SigilMeshService
-    from app.services.risk_service import SentinelaService
-    from app.services.gas_monitor_service import GasMonitorService
-
-    import app.routers.dfc_router as dfc_router_module
-    import app.routers.score_router as score_router_module
-    import app.routers.sherlock_router as sherlock_router_module
-    import app.routers.nft_router as nft_router_module
-    import app.routers.risk_router as risk_router_module
-    import app.routers.gas_monitor_router as gas_monitor_router_module
-
-    dfc_router_module.dfc_service = DFCService()
-    score_router_module.score_service = ScoreLabService()
-    sherlock_router_module.sherlock_service = SherlockService()
-    nft_router_module.sigilmesh_service = SigilMeshService()
-    risk_router_module.sentinela_service = SentinelaService()
-    gas_monitor_router_module.gas_monitor_service = GasMonitorService()
+    db = mongo_client_fixture[settings.MONGO_DB_NAME]
+    # delete_many keeps the collections (and their indexes) alive; dropping them on every test is far slower.
+    collection_names = [name for name in await db.list_collection_names() if not name.startswith("system.")]
+    await asyncio.gather(*(db[name].delete_many({}) for name in collection_names))
+    logger.debug("Cleared database: %s", db.name)
 
 
 @pytest_asyncio.fixture(scope="session")
-async def client(mongo_client_fixture: AsyncIOMotorClient) -> AsyncGenerator[AsyncClient, None]:
-    async with app.lifespan_context():
-        async with AsyncClient(app=app, base_url="http://test") as ac:
+async def client(mongo_client_fixture: AsyncIOMotorClient, _ensure_indexes) -> AsyncGenerator[AsyncClient, None]:
+    """
+    One AsyncClient for the whole session: the app lifespan, the ASGI transport and the Motor
+    client are set up once and shared by every test. Isolation comes from clear_database, which
+    empties collections between tests instead of rebuilding the app.
+    """
+    from app import database
+
+    async with app.router.lifespan_context(app):
+        # O lifespan deve reaproveitar o cliente injetado por mongo_client_fixture, não abrir outro.
+        assert database.client is mongo_client_fixture
+        # Transporte ASGI explícito: as requisições vão direto para o app, sem socket de loopback.
+        # O AuthMiddleware exige o token em toda rota não pública; os clientes de teste o enviam sempre.
+        async with AsyncClient(
+            transport=ASGITransport(app=app),
+            base_url="http://test",
+            headers={"Authorization": settings.API_AUTH_TOKEN},
+        ) as ac:
             yield ac
 
 
+@pytest_asyncio.fixture(scope="session")
+async def pure_client() -> AsyncGenerator[AsyncClient, None]:
+    """
+    Client for endpoints that never touch MongoDB (e.g. /health).
+    Skips the app lifespan and mongo_client_fixture entirely.
+    """
+    async with AsyncClient(
+        transport=ASGITransport(app=app),
+        base_url="http://test",
+        headers={"Authorization": settings.API_AUTH_TOKEN},
+    ) as ac:
+        yield ac
+
+
 @pytest.fixture(scope="session")
 def faker_instance():
     return Faker()
 
 
+@pytest.fixture(scope="session")
+def uuid_factory():
+    """Callable returning a fresh opaque id (uuid4 hex); a cheaper stand-in for faker_instance.uuid4()."""
+    return rand_id
+
+
+def _flag_data(
+    faker_instance: Faker,
+    name: str = None,
+    description: str = None,
+    flag_type: FlagType = FlagType.BOOLEAN,
+    default_value: Any = False,
+    rules: List[Dict[str, Any]] = None,
+    weight: float = 0.0,
+    category: str = None,
+) -> Dict[str, Any]:
+    return {
+        "name": name if name else faker_instance.word() + "_flag_" + rand_id()[:4],
+        "description": description if description else faker_instance.sentence(),
+        "type": flag_type.value,
+        "default_value": default_value,
+        "rules": rules if rules is not None else [],
+        "weight": weight,
+        "category": category if category else faker_instance.word(),
+    }
+
+
 @pytest_asyncio.fixture
 async def create_flag_definition(client: AsyncClient, faker_instance: Faker):
-    async def _create_flag(
-        name: str = None,
-        description: str = None,
-        flag_type: FlagType = FlagType.BOOLEAN,
-        default_value: Any = False,
-        rules: List[Dict[str, Any]] = None,
-        weight: float = 0.0,
-        category: str = None,
-    ) -> FlagDefinition:
-        flag_data = {
-            "name": name if name else faker_instance.word() + "_flag_" + faker_instance.uuid4()[:4],
-            "description": description if description else faker_instance.sentence(),
-            "type": flag_type.value,
-            "default_value": default_value,
-            "rules": rules if rules is not None else [],
-            "weight": weight,
-            "category": category if category else faker_instance.word(),
-        }
-        response = await client.post("/flags/definitions", json=flag_data)
+    async def _create_flag(**kwargs) -> FlagDefinition:
+        response = await client.post("/flags/definitions", json=_flag_data(faker_instance, **kwargs))
         assert response.status_code == 201, response.text
-        return FlagDefinition(**response.json())
+        return _FlagAdapter.validate_json(response.content)
     return _create_flag
 
 
 @pytest_asyncio.fixture
-async def create_score_result(client: AsyncClient, faker_instance: Faker):
+async def create_flag_definition_direct(mongo_client_fixture: AsyncIOMotorClient, faker_instance: Faker):
+    """Seeds a flag definition through DFCService, skipping the HTTP stack. For setup only."""
+    async def _create_flag(**kwargs) -> FlagDefinition:
+        flag_input = DynamicFlagCreate(**_flag_data(faker_instance, **kwargs))
+        flag = await DFCService().create_flag_definition(flag_input.model_dump())
+        assert flag is not None, f"Flag '{flag_input.name}' already exists."
+        return flag
+    return _create_flag
+
+
+@dataclass(frozen=True)
+class ScoreHandle:
+    """ScoreResult returned by create_score_result, with its id stringified once. Other attributes delegate to it."""
+    result: ScoreResult
+    id_str: str
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.result, name)
+
+
+@pytest_asyncio.fixture
+async def create_score_result(client: AsyncClient):
     async def _create_score(
         entity_id: str = None,
         flags: List[FlagWithValue] = None,
         metadata: Dict[str, Any] = None,
-    ) -> ScoreResult:
+    ) -> ScoreHandle:
         score_input_data = {
-            "entity_id": entity_id if entity_id else faker_instance.uuid4(),
+            "entity_id": entity_id if entity_id else rand_id(),
             "flags": [f.model_dump() for f in (flags if flags is not None else [])],
             "metadata": metadata if metadata else {},
         }
         response = await client.post("/scores", json=score_input_data)
         assert response.status_code == 201, response.text
-        return ScoreResult(**response.json())
+        result = _ScoreAdapter.validate_json(response.content)
+        return ScoreHandle(result=result, id_str=str(result.id))
     return _create_score
 
 
+def _trigger_data(
+    faker_instance: Faker,
+    name: str = None,
+    description: str = None,
+    trigger_type: str = "score_threshold",
+    score_threshold: float = None,
+    flag_name: str = None,
+    custom_logic_params: Dict[str, Any] = None,
+    risk_level: RiskLevel = RiskLevel.HIGH,
+    is_active: bool = True,
+) -> Dict[str, Any]:
+    return {
+        "name": name if name else faker_instance.word() + "_trigger_" + rand_id()[:4],
+        "description": description if description else faker_instance.sentence(),
+        "trigger_type": trigger_type,
+        "score_threshold": score_threshold,
+        "flag_name": flag_name,
+        "custom_logic_params": custom_logic_params,
+        "risk_level": risk_level.value,
+        "is_active": is_active,
+    }
+
+
 @pytest_asyncio.fixture
 async def create_risk_trigger(client: AsyncClient, faker_instance: Faker):
-    async def _create_trigger(
-        name: str = None,
-        description: str = None,
-        trigger_type: str = "score_threshold",
-        score_threshold: float = None,
-        flag_name: str = None,
-        custom_logic_params: Dict[str, Any] = None,
-        risk_level: RiskLevel = RiskLevel.HIGH,
-        is_active: bool = True,
-    ) -> RiskTrigger:
-        trigger_data = {
-            "name": name if name else faker_instance.word() + "_trigger_" + faker_instance.uuid4()[:4],
-            "description": description if description else faker_instance.sentence(),
-            "trigger_type": trigger_type,
-            "score_threshold": score_threshold,
-            "flag_name": flag_name,
-            "custom_logic_params": custom_logic_params,
-            "risk_level": risk_level.value,
-            "is_active": is_active,
-        }
-        response = await client.post("/sentinela/triggers", json=trigger_data)
+    async def _create_trigger(**kwargs) -> RiskTrigger:
+        response = await client.post("/sentinela/triggers", json=_trigger_data(faker_instance, **kwargs))
         assert response.status_code == 201, response.text
-        return RiskTrigger(**response.json())
+        return _TriggerAdapter.validate_json(response.content)
+    return _create_trigger
+
+
+@pytest_asyncio.fixture
+async def create_risk_trigger_direct(mongo_client_fixture: AsyncIOMotorClient, faker_instance: Faker):
+    """Seeds a risk trigger through SentinelaService, skipping the HTTP stack. For setup only."""
+    async def _create_trigger(**kwargs) -> RiskTrigger:
+        trigger_input = CreateRiskTrigger(**_trigger_data(faker_instance, **kwargs))
+        trigger = await SentinelaService().create_risk_trigger(trigger_input.model_dump())
+        assert trigger is not None, f"Trigger '{trigger_input.name}' already exists."
+        return trigger
     return _create_trigger
 
 
+@pytest.fixture
+def assess_risk(client: AsyncClient):
+    """POSTs to /sentinela/assess; additional_context is sent only when keyword arguments are given."""
+    async def _assess(entity_id: str, score_id: str, **additional_context: Any) -> Response:
+        payload: Dict[str, Any] = {"entity_id": entity_id, "score_id": score_id}
+        if additional_context:
+            payload["additional_context"] = additional_context
+        return await client.post("/sentinela/assess", json=payload)
+    return _assess
+
+
+# Triggers canônicos para testes que apenas leem; testes que alteram triggers usam create_risk_trigger.
+SEED_TRIGGERS: Dict[str, Dict[str, Any]] = {
+    "active_trigger_1": {"is_active": True},
+    "inactive_trigger_1": {"is_active": False},
+    "get_by_name_trigger": {},
+}
+
+
 @pytest_asyncio.fixture
-async def create_sherlock_validation_result(client: AsyncClient, faker_instance: Faker):
+async def seed_triggers(clear_database, faker_instance: Faker) -> Dict[str, Dict[str, Any]]:
+    """
+    Inserts the canonical read-only triggers with a single insert_many.
+    Depends on clear_database so the collection is always emptied first, whatever the module marks.
+    """
+    triggers_data = [
+        CreateRiskTrigger(**_trigger_data(faker_instance, name=name, **overrides)).model_dump()
+        for name, overrides in SEED_TRIGGERS.items()
+    ]
+    result = await SentinelaService().create_risk_triggers_bulk(triggers_data)
+    assert not result.skipped, result.skipped
+    return {t["name"]: t for t in triggers_data}
+
+
+@pytest_asyncio.fixture
+async def create_sherlock_validation_result(client: AsyncClient):
     async def _create_sherlock_result(
         entity_id: str = None,
         entity_type: str = "wallet_address"
     ) -> SherlockValidationResult:
         validation_input_data = {
-            "entity_id": entity_id if entity_id else faker_instance.uuid4(),
+            "entity_id": entity_id if entity_id else rand_id(),
             "entity_type": entity_type,
         }
         response = await client.post("/sherlock/validate", json=validation_input_data)
         assert response.status_code == 200, response.text
-        return SherlockValidationResult(**response.json())
+        return _SherlockAdapter.validate_json(response.content)
     return _create_sherlock_result
 
 
+def _gas_record_data(entity_id: str, gas_used: int = None, timestamp: datetime = None) -> Dict[str, Any]:
+    return {
+        "transaction_hash": rand_hash(),
+        "entity_id": entity_id,
+        "gas_used": gas_used if gas_used else random.randint(21000, 500000),
+        "gas_price_gwei": random.randint(10, 100),
+        "block_number": random.randint(100000, 90000000),
+        "timestamp": (timestamp if timestamp else datetime.utcnow()).isoformat(),
+        "chain_id": 1,
+        "transaction_type": "ERC20_Transfer"
+    }
+
+
 @pytest_asyncio.fixture
-async def create_gas_record(client: AsyncClient, faker_instance: Faker):
+async def create_gas_record(client: AsyncClient):
     async def _create_gas_record(
         entity_id: str = None,
         gas_used: int = None,
         timestamp: datetime = None
     ) -> GasConsumptionRecord:
-        record_data = {
-            "transaction_hash": faker_instance.sha256(),
-            "entity_id": entity_id if entity_id else faker_instance.uuid4(),
-            "gas_used": gas_used if gas_used else faker_instance.random_int(min=21000, max=500000),
-            "gas_price_gwei": faker_instance.random_int(min=10, max=100),
-            "block_number": faker_instance.random_int(min=100000, max=90000000),
-            "timestamp": (timestamp if timestamp else datetime.utcnow()).isoformat(),
-            "chain_id": 1,
-            "transaction_type": "ERC20_Transfer"
-        }
+        record_data = _gas_record_data(
+            entity_id if entity_id else rand_id(), gas_used, timestamp
+        )
         response = await client.post("/gasmonitor/ingest", json=record_data)
         assert response.status_code == 201, response.text
-        return GasConsumptionRecord(**response.json())
+        return _GasAdapter.validate_json(response.content)
     return _create_gas_record
+
+
+@pytest_asyncio.fixture
+async def create_gas_records(client: AsyncClient):
+    """Creates `count` gas records for one entity with a single bulk ingest request."""
+    async def _create_gas_records(
+        entity_id: str = None,
+        count: int = 1,
+        gas_used: Optional[List[int]] = None,
+        timestamps: Optional[List[datetime]] = None,
+    ) -> List[GasConsumptionRecord]:
+        entity_id = entity_id if entity_id else rand_id()
+        records_data = [
+            _gas_record_data(
+                entity_id,
+                gas_used[i] if gas_used else None,
+                timestamps[i] if timestamps else None,
+            )
+            for i in range(count)
+        ]
+        response = await client.post("/gasmonitor/ingest/bulk", json=records_data)
+        assert response.status_code == 201, response.text
+        return _GasListAdapter.validate_json(response.content)
+    return _create_gas_records
+
+
+@pytest_asyncio.fixture
+async def create_gas_records_direct(mongo_client_fixture: AsyncIOMotorClient):
+    """Same as create_gas_records, but seeds through GasMonitorService without going through HTTP."""
+    async def _create_gas_records(
+        entity_id: str = None,
+        count: int = 1,
+        gas_used: Optional[List[int]] = None,
+        timestamps: Optional[List[datetime]] = None,
+    ) -> List[GasConsumptionRecord]:
+        entity_id = entity_id if entity_id else rand_id()
+        records = [
+            IngestGasConsumptionInput(
+                **_gas_record_data(
+                    entity_id,
+                    gas_used[i] if gas_used else None,
+                    timestamps[i] if timestamps else None,
+                )
+            )
+            for i in range(count)
+        ]
+        return await GasMonitorService().ingest_records([r.model_dump() for r in records])
+    return _create_gas_records
@@ -0,0 +1,51 @@
+"""
+Guards the cursor chains the services iterate with `async for` against both test backends.
+
+mongomock-motor only wraps part of the Motor cursor API; any other chained method falls back to the
+sync mongomock Cursor and breaks `async for`. Each case drains one real service cursor for an entity
+with no data, so a chain the mock backend does not support fails here, not as a 500 in a route test.
+CI runs this module again with TEST_BACKEND=inmemory to pin the same chains against a real mongod.
+"""
+import pytest
+from fastapi import HTTPException
+
+from app.repositories.score_repository import ScoreRepository
+from app.routers.audit_router import get_logs
+from app.services.dfc_service import DFCService
+from app.services.gas_monitor_service import GasMonitorService
+from app.services.risk_service import SentinelaService
+from app.services.sherlock_service import SherlockService
+
+pytestmark = pytest.mark.usefixtures("clear_database")
+
+_UNKNOWN_ENTITY = "cursor_chain_unknown_entity"
+
+
+async def _sherlock_history():
+    return [r async for r in SherlockService().iter_validation_results_by_entity_id(_UNKNOWN_ENTITY)]
+
+
+async def _gas_analysis():
+    # Sem registros o serviço responde 404 depois de esgotar o cursor.
+    with pytest.raises(HTTPException) as exc_info:
+        await GasMonitorService().analyze_patterns(_UNKNOWN_ENTITY, lookback_days=7)
+    assert exc_info.value.status_code == 404
+    return []
+
+
+# find().sort(), find().sort().skip().limit(), find(batch_size=...).sort() e find() puro.
+CURSOR_CHAINS = [
+    pytest.param(lambda: ScoreRepository().get_by_entity_id(_UNKNOWN_ENTITY), id="scores_by_entity"),
+    pytest.param(_sherlock_history, id="sherlock_history"),
+    pytest.param(lambda: GasMonitorService().get_records_by_entity(_UNKNOWN_ENTITY, limit=5, skip=1), id="gas_records"),
+    pytest.param(_gas_analysis, id="gas_analysis"),
+    pytest.param(lambda: SentinelaService().get_all_risk_triggers(), id="active_triggers"),
+    pytest.param(lambda: DFCService().get_all_flag_definitions(), id="flag_definitions"),
+    pytest.param(get_logs, id="audit_logs"),
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("drain", CURSOR_CHAINS)
+async def test_service_cursor_chain_is_async_iterable(drain):
+    assert await drain() == []
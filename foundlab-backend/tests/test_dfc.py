@@ -1,7 +1,12 @@
+import asyncio
+
 import pytest
 from httpx import AsyncClient
 
 from app.models.dfc import FlagDefinition, FlagType, Rule, RuleCondition
+from app.services.dfc_service import DFCService
+
+pytestmark = pytest.mark.usefixtures("clear_database")
 
 
 @pytest.mark.asyncio
@@ -27,15 +32,32 @@ async def test_create_flag_definition_duplicate_name(client: AsyncClient, create
 
 
 @pytest.mark.asyncio
-async def test_get_all_flag_definitions(client: AsyncClient, create_flag_definition):
+async def test_create_flag_definitions_batch_skips_existing(client: AsyncClient, create_flag_definition):
+    """Test bulk-creating flag definitions, skipping names that already exist."""
+    await create_flag_definition(name="batch_existing_flag")
+    response = await client.post("/flags/definitions:batch", json=[
+        {"name": "batch_existing_flag", "description": "Already there.", "type": "boolean"},
+        {"name": "batch_new_flag", "description": "Brand new.", "type": "boolean"},
+    ])
+    assert response.status_code == 201
+    assert response.json() == {"created": ["batch_new_flag"], "skipped": ["batch_existing_flag"]}
+
+    response = await client.get("/flags/definitions/batch_new_flag")
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_get_all_flag_definitions(client: AsyncClient, create_flag_definition_direct):
     """Test retrieving all flag definitions."""
-    flag1 = await create_flag_definition(name="all_flag_1")
-    flag2 = await create_flag_definition(name="all_flag_2")
+    flag1, flag2 = await asyncio.gather(
+        create_flag_definition_direct(name="all_flag_1"), create_flag_definition_direct(name="all_flag_2")
+    )
     response = await client.get("/flags/definitions")
     assert response.status_code == 200
-    assert len(response.json()) >= 2
-    assert any(f["name"] == flag1.name for f in response.json())
-    assert any(f["name"] == flag2.name for f in response.json())
+    body = response.json()
+    assert len(body) >= 2
+    assert any(f["name"] == flag1.name for f in body)
+    assert any(f["name"] == flag2.name for f in body)
 
 
 @pytest.mark.asyncio
@@ -61,10 +83,11 @@ async def test_update_flag_definition(client: AsyncClient, create_flag_definitio
     update_data = {"description": "Updated description.", "weight": 0.8}
     response = await client.put(f"/flags/definitions/{flag.name}", json=update_data)
     assert response.status_code == 200
-    assert response.json()["description"] == "Updated description."
-    assert response.json()["weight"] == 0.8
-    assert response.json()["name"] == flag.name
-    assert response.json()["type"] == flag.type.value
+    body = response.json()
+    assert body["description"] == "Updated description."
+    assert body["weight"] == 0.8
+    assert body["name"] == flag.name
+    assert body["type"] == flag.type.value
 
 
 @pytest.mark.asyncio
@@ -116,11 +139,12 @@ async def test_apply_dynamic_flags_simple_match(client: AsyncClient, create_flag
     }
     response = await client.post("/flags/apply", json=input_data)
     assert response.status_code == 200
-    assert response.json()["entity_id"] == input_data["entity_id"]
-    assert len(response.json()["evaluated_flags"]) == 1
-    assert response.json()["evaluated_flags"][0]["flag_name"] == "high_risk_user"
-    assert response.json()["evaluated_flags"][0]["is_active"] is True
-    assert response.json()["active_flags_summary"]["high_risk_user"] is True
+    body = response.json()
+    assert body["entity_id"] == input_data["entity_id"]
+    assert len(body["evaluated_flags"]) == 1
+    assert body["evaluated_flags"][0]["flag_name"] == "high_risk_user"
+    assert body["evaluated_flags"][0]["is_active"] is True
+    assert body["active_flags_summary"]["high_risk_user"] is True
 
 
 @pytest.mark.asyncio
@@ -137,10 +161,11 @@ async def test_apply_dynamic_flags_no_match(client: AsyncClient, create_flag_def
     }
     response = await client.post("/flags/apply", json=input_data)
     assert response.status_code == 200
-    assert len(response.json()["evaluated_flags"]) == 1
-    assert response.json()["evaluated_flags"][0]["flag_name"] == "high_risk_user_no_match"
-    assert response.json()["evaluated_flags"][0]["is_active"] is False
-    assert "high_risk_user_no_match" not in response.json()["active_flags_summary"]
+    body = response.json()
+    assert len(body["evaluated_flags"]) == 1
+    assert body["evaluated_flags"][0]["flag_name"] == "high_risk_user_no_match"
+    assert body["evaluated_flags"][0]["is_active"] is False
+    assert "high_risk_user_no_match" not in body["active_flags_summary"]
 
 
 @pytest.mark.asyncio
@@ -160,11 +185,12 @@ async def test_apply_dynamic_flags_default_value_no_rules(client: AsyncClient, c
     }
     response = await client.post("/flags/apply", json=input_data)
     assert response.status_code == 200
-    assert response.json()["evaluated_flags"][0]["flag_name"] == "always_on_flag"
-    assert response.json()["evaluated_flags"][0]["is_active"] is True
-    assert response.json()["evaluated_flags"][0]["value"] is True
-    assert response.json()["evaluated_flags"][0]["reason"] == "No rules defined for dynamic evaluation, using default value."
-    assert response.json()["active_flags_summary"]["always_on_flag"] is True
+    body = response.json()
+    assert body["evaluated_flags"][0]["flag_name"] == "always_on_flag"
+    assert body["evaluated_flags"][0]["is_active"] is True
+    assert body["evaluated_flags"][0]["value"] is True
+    assert body["evaluated_flags"][0]["reason"] == "No rules defined for dynamic evaluation, using default value."
+    assert body["active_flags_summary"]["always_on_flag"] is True
 
 
 @pytest.mark.asyncio
@@ -178,16 +204,18 @@ async def test_apply_dynamic_flags_boolean_output_value(client: AsyncClient, cre
     input_data_true = {"entity_id": faker_instance.uuid4(), "metadata": {"age": 20}}
     response_true = await client.post("/flags/apply", json=input_data_true)
     assert response_true.status_code == 200
-    assert response_true.json()["evaluated_flags"][0]["flag_name"] == "is_adult"
-    assert response_true.json()["evaluated_flags"][0]["is_active"] is True
-    assert response_true.json()["evaluated_flags"][0]["value"] is True
+    flag_true = response_true.json()["evaluated_flags"][0]
+    assert flag_true["flag_name"] == "is_adult"
+    assert flag_true["is_active"] is True
+    assert flag_true["value"] is True
 
     input_data_false = {"entity_id": faker_instance.uuid4(), "metadata": {"age": 16}}
     response_false = await client.post("/flags/apply", json=input_data_false)
     assert response_false.status_code == 200
-    assert response_false.json()["evaluated_flags"][0]["flag_name"] == "is_adult"
-    assert response_false.json()["evaluated_flags"][0]["is_active"] is False
-    assert response_false.json()["evaluated_flags"][0]["value"] is False
+    flag_false = response_false.json()["evaluated_flags"][0]
+    assert flag_false["flag_name"] == "is_adult"
+    assert flag_false["is_active"] is False
+    assert flag_false["value"] is False
 
 
 @pytest.mark.asyncio
@@ -202,6 +230,31 @@ async def test_apply_dynamic_flags_numeric_output_value(client: AsyncClient, cre
     input_data = {"entity_id": faker_instance.uuid4(), "metadata": {"volume": 1500.50}}
     response = await client.post("/flags/apply", json=input_data)
     assert response.status_code == 200
-    assert response.json()["evaluated_flags"][0]["flag_name"] == "transaction_volume_flag"
-    assert response.json()["evaluated_flags"][0]["is_active"] is True
-    assert response.json()["evaluated_flags"][0]["value"] == 1500.50
+    body = response.json()
+    assert body["evaluated_flags"][0]["flag_name"] == "transaction_volume_flag"
+    assert body["evaluated_flags"][0]["is_active"] is True
+    assert body["evaluated_flags"][0]["value"] == 1500.50
+
+
+# (condição, valor da regra, valor no metadata, resultado esperado); None no metadata = campo ausente.
+RULE_CONDITION_CASES = [
+    pytest.param(RuleCondition.EQ, "gold", "gold", True, id="eq"),
+    pytest.param(RuleCondition.NE, "gold", "silver", True, id="ne"),
+    pytest.param(RuleCondition.GT, 10, 10, False, id="gt_equal"),
+    pytest.param(RuleCondition.GTE, 10, 10, True, id="gte"),
+    pytest.param(RuleCondition.LT, 10, 9, True, id="lt"),
+    pytest.param(RuleCondition.LTE, 10, 11, False, id="lte_above"),
+    pytest.param(RuleCondition.CONTAINS, "mixer", "tornado_mixer_tx", True, id="contains_str"),
+    pytest.param(RuleCondition.CONTAINS, 1, 123, False, id="contains_not_iterable"),
+    pytest.param(RuleCondition.IN, ["BR", "PT"], "PT", True, id="in"),
+    pytest.param(RuleCondition.IN, "BR", "BR", False, id="in_not_list"),
+    pytest.param(RuleCondition.NOT_IN, ["BR"], "US", False, id="unsupported_condition"),
+    pytest.param(RuleCondition.EQ, "gold", None, False, id="missing_field"),
+]
+
+
+@pytest.mark.parametrize("condition,rule_value,field_value,expected", RULE_CONDITION_CASES)
+def test_evaluate_rule_conditions(condition, rule_value, field_value, expected):
+    rule = {"field": "attr", "condition": condition, "value": rule_value}
+    metadata = {} if field_value is None else {"attr": field_value}
+    assert DFCService()._evaluate_rule(rule, metadata) is expected
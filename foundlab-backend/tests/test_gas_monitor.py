@@ -1,3 +1,4 @@
+import asyncio
 from datetime import datetime, timedelta
 
 import pytest
@@ -6,6 +7,8 @@ from httpx import AsyncClient
 
 from app.models.gas_monitor import GasConsumptionRecord
 
+pytestmark = pytest.mark.usefixtures("clear_database")
+
 
 @pytest.mark.asyncio
 async def test_ingest_gas_consumption_record(client: AsyncClient, create_gas_record, faker_instance: Faker):
@@ -16,11 +19,23 @@ async def test_ingest_gas_consumption_record(client: AsyncClient, create_gas_rec
 
 
 @pytest.mark.asyncio
-async def test_get_records_for_entity(client: AsyncClient, create_gas_record, faker_instance: Faker):
+async def test_ingest_gas_consumption_bulk(client: AsyncClient, create_gas_records, faker_instance: Faker):
+    """Test ingesting several gas consumption records in one request."""
+    entity_id = faker_instance.uuid4()
+    records = await create_gas_records(entity_id=entity_id, count=4)
+    assert len(records) == 4
+    assert all(r.id is not None and r.entity_id == entity_id for r in records)
+    assert len({r.transaction_hash for r in records}) == 4
+
+
+@pytest.mark.asyncio
+async def test_get_records_for_entity(client: AsyncClient, create_gas_records_direct, faker_instance: Faker):
     """Test retrieving gas consumption records for a specific entity."""
     entity_id = faker_instance.uuid4()
-    for i in range(3):
-        await create_gas_record(entity_id=entity_id, timestamp=datetime.utcnow() - timedelta(minutes=i))
+    base = datetime.utcnow()
+    await create_gas_records_direct(
+        entity_id=entity_id, count=3, timestamps=[base - timedelta(minutes=i) for i in range(3)]
+    )
 
     response = await client.get(f"/gasmonitor/records/{entity_id}")
     assert response.status_code == 200
@@ -31,11 +46,13 @@ async def test_get_records_for_entity(client: AsyncClient, create_gas_record, fa
 
 
 @pytest.mark.asyncio
-async def test_get_records_for_entity_pagination(client: AsyncClient, create_gas_record, faker_instance: Faker):
+async def test_get_records_for_entity_pagination(client: AsyncClient, create_gas_records_direct, faker_instance: Faker):
     """Test pagination for retrieving gas consumption records."""
     entity_id = faker_instance.uuid4()
-    for i in range(10):
-        await create_gas_record(entity_id=entity_id, timestamp=datetime.utcnow() - timedelta(minutes=i))
+    base = datetime.utcnow()
+    await create_gas_records_direct(
+        entity_id=entity_id, count=10, timestamps=[base - timedelta(minutes=i) for i in range(10)]
+    )
 
     response_limit_3 = await client.get(f"/gasmonitor/records/{entity_id}?limit=3")
     assert response_limit_3.status_code == 200
@@ -43,11 +60,12 @@ async def test_get_records_for_entity_pagination(client: AsyncClient, create_gas
 
     response_skip_5 = await client.get(f"/gasmonitor/records/{entity_id}?skip=5&limit=3")
     assert response_skip_5.status_code == 200
-    assert len(response_skip_5.json()) == 3
+    skip_5 = response_skip_5.json()
+    assert len(skip_5) == 3
 
     full_list_response = await client.get(f"/gasmonitor/records/{entity_id}?limit=10")
     full_list = full_list_response.json()
-    assert response_skip_5.json()[0]["transaction_hash"] == full_list[5]["transaction_hash"]
+    assert skip_5[0]["transaction_hash"] == full_list[5]["transaction_hash"]
 
 
 @pytest.mark.asyncio
@@ -60,12 +78,21 @@ async def test_analyze_gas_patterns_no_records_found(client: AsyncClient, faker_
 
 
 @pytest.mark.asyncio
-async def test_analyze_gas_patterns_detect_high_spike(client: AsyncClient, create_gas_record, faker_instance: Faker):
+async def test_analyze_gas_patterns_detect_high_spike(client: AsyncClient, create_gas_records_direct, faker_instance: Faker):
     """Test analysis detecting a high gas spike."""
     entity_id = faker_instance.uuid4()
-    for i in range(5):
-        await create_gas_record(entity_id=entity_id, gas_used=faker_instance.random_int(min=50000, max=100000), timestamp=datetime.utcnow() - timedelta(hours=i))
-    spike_record = await create_gas_record(entity_id=entity_id, gas_used=5000000, timestamp=datetime.utcnow() - timedelta(minutes=1))
+    base = datetime.utcnow()
+    _, (spike_record,) = await asyncio.gather(
+        create_gas_records_direct(
+            entity_id=entity_id,
+            count=5,
+            gas_used=[faker_instance.random_int(min=50000, max=100000) for _ in range(5)],
+            timestamps=[base - timedelta(hours=i) for i in range(5)],
+        ),
+        create_gas_records_direct(
+            entity_id=entity_id, gas_used=[5000000], timestamps=[base - timedelta(minutes=1)]
+        ),
+    )
 
     response = await client.post(f"/gasmonitor/analyze/{entity_id}", json={"lookBackDays": 7})
     assert response.status_code == 200
@@ -79,11 +106,12 @@ async def test_analyze_gas_patterns_detect_high_spike(client: AsyncClient, creat
 
 
 @pytest.mark.asyncio
-async def test_analyze_gas_patterns_no_anomaly(client: AsyncClient, create_gas_record, faker_instance: Faker):
+async def test_analyze_gas_patterns_no_anomaly(client: AsyncClient, create_gas_records_direct, faker_instance: Faker):
     """Test analysis with no anomalies detected."""
     entity_id = faker_instance.uuid4()
-    for _ in range(5):
-        await create_gas_record(entity_id=entity_id, gas_used=faker_instance.random_int(min=50000, max=70000))
+    await create_gas_records_direct(
+        entity_id=entity_id, count=5, gas_used=[faker_instance.random_int(min=50000, max=70000) for _ in range(5)]
+    )
 
     response = await client.post(f"/gasmonitor/analyze/{entity_id}", json={"lookBackDays": 7})
     assert response.status_code == 200
@@ -5,17 +5,18 @@ from app.config import settings
 
 
 @pytest.mark.asyncio
-async def test_health_check(client: AsyncClient):
+async def test_health_check(pure_client: AsyncClient):
     """Test the /health endpoint."""
-    response = await client.get("/health")
+    response = await pure_client.get("/health")
     assert response.status_code == 200
     assert response.json() == {"status": "ok", "message": "Application is running normally."}
 
 
 @pytest.mark.asyncio
-async def test_get_version(client: AsyncClient):
+async def test_get_version(pure_client: AsyncClient):
     """Test the /version endpoint."""
-    response = await client.get("/version")
+    response = await pure_client.get("/version")
     assert response.status_code == 200
-    assert response.json()["app_name"] == settings.APP_NAME
-    assert response.json()["version"] == settings.APP_VERSION
+    body = response.json()
+    assert body["app_name"] == settings.APP_NAME
+    assert body["version"] == settings.APP_VERSION
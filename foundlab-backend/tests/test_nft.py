@@ -5,9 +5,11 @@ from pydantic_extra_types.color import Color
 from app.models.risk import RiskLevel
 from app.models.score import FlagWithValue, ScoreResult
 
+pytestmark = pytest.mark.usefixtures("clear_database")
+
 
 @pytest.mark.asyncio
-async def test_generate_sigilmesh_nft_metadata_success(client: AsyncClient, create_score_result, create_risk_trigger, faker_instance):
+async def test_generate_sigilmesh_nft_metadata_success(client: AsyncClient, assess_risk, create_score_result, faker_instance):
     """Test successful generation of NFT metadata for a high score (implies low risk)."""
     entity_id = faker_instance.uuid4()
 
@@ -20,11 +22,11 @@ async def test_generate_sigilmesh_nft_metadata_success(client: AsyncClient, crea
         metadata={"account_age_days": 1000}
     )
 
-    await client.post("/sentinela/assess", json={"entity_id": entity_id, "score_id": str(score_result.id)})
+    await assess_risk(entity_id, score_result.id_str)
 
     input_data = {
         "entity_id": entity_id,
-        "score_id": str(score_result.id),
+        "score_id": score_result.id_str,
         "custom_name": "My Custom Sigil",
         "custom_description": "This is a custom description for the NFT."
     }
@@ -32,7 +34,7 @@ async def test_generate_sigilmesh_nft_metadata_success(client: AsyncClient, crea
     assert response.status_code == 201
     nft_output = response.json()
     assert nft_output["entity_id"] == entity_id
-    assert nft_output["score_id"] == str(score_result.id)
+    assert nft_output["score_id"] == score_result.id_str
     assert nft_output["nft_metadata"]["name"] == "My Custom Sigil"
     assert "FoundLab Score" in [attr["trait_type"] for attr in nft_output["nft_metadata"]["attributes"]]
     assert any(attr["value"] == f"{score_result.probability_score:.4f}" for attr in nft_output["nft_metadata"]["attributes"])
@@ -40,7 +42,9 @@ async def test_generate_sigilmesh_nft_metadata_success(client: AsyncClient, crea
 
 
 @pytest.mark.asyncio
-async def test_generate_sigilmesh_nft_metadata_with_low_score_high_risk(client: AsyncClient, create_score_result, create_risk_trigger, faker_instance):
+async def test_generate_sigilmesh_nft_metadata_with_low_score_high_risk(
+    client: AsyncClient, assess_risk, create_score_result, create_risk_trigger_direct, faker_instance
+):
     """Test NFT metadata generation for a low score, which should imply high risk and red color."""
     entity_id = faker_instance.uuid4()
     score_result = await create_score_result(
@@ -52,15 +56,15 @@ async def test_generate_sigilmesh_nft_metadata_with_low_score_high_risk(client:
         metadata={"account_age_days": 10}
     )
 
-    await create_risk_trigger(name="low_score_trigger", score_threshold=score_result.probability_score + 0.01, risk_level=RiskLevel.HIGH)
+    await create_risk_trigger_direct(name="low_score_trigger", score_threshold=score_result.probability_score + 0.01, risk_level=RiskLevel.HIGH)
 
-    risk_assessment = await client.post("/sentinela/assess", json={"entity_id": entity_id, "score_id": str(score_result.id)})
+    risk_assessment = await assess_risk(entity_id, score_result.id_str)
     assert risk_assessment.status_code == 200
     assert risk_assessment.json()["overall_risk_level"] == RiskLevel.HIGH.value
 
     input_data = {
         "entity_id": entity_id,
-        "score_id": str(score_result.id)
+        "score_id": score_result.id_str
     }
     response = await client.post("/nft/metadata", json=input_data)
     assert response.status_code == 201
@@ -89,7 +93,7 @@ async def test_generate_sigilmesh_nft_metadata_mismatched_entity_id(client: Asyn
     score_result = await create_score_result(entity_id=faker_instance.uuid4())
     input_data = {
         "entity_id": faker_instance.uuid4(),  # Different entity ID
-        "score_id": str(score_result.id)
+        "score_id": score_result.id_str
     }
     response = await client.post("/nft/metadata", json=input_data)
     assert response.status_code == 400
@@ -104,7 +108,7 @@ async def test_generate_sigilmesh_nft_metadata_custom_background_color(client: A
 
     input_data = {
         "entity_id": entity_id,
-        "score_id": str(score_result.id),
+        "score_id": score_result.id_str,
         "background_color": "#FFC0CB"
     }
 
@@ -1,9 +1,19 @@
+import asyncio
+
 import pytest
 from httpx import AsyncClient
 
 from app.models.risk import RiskLevel, RiskTrigger
 from app.models.score import ScoreResult, FlagWithValue
 
+pytestmark = pytest.mark.usefixtures("clear_database")
+
+# Flags reutilizadas pelos testes de assess; só são lidas (model_dump), nunca alteradas.
+_NEG_IMPACT_FLAG = FlagWithValue(name="negative_impact", value=0.0, weight=1.0)
+_SANCTIONED_FLAG = FlagWithValue(name="sanctioned_country_flag", value=1.0, weight=1.0, is_active=True)
+_DEFAULT_SCORE_FLAG = FlagWithValue(name="default_score", value=0.1, weight=1.0)
+_IS_SANCTIONED_FLAG = FlagWithValue(name="is_sanctioned", value=1.0, weight=1.0, is_active=True)
+
 
 @pytest.mark.asyncio
 async def test_create_risk_trigger(client: AsyncClient, create_risk_trigger):
@@ -26,21 +36,45 @@ async def test_create_risk_trigger_duplicate(client: AsyncClient, create_risk_tr
 
 
 @pytest.mark.asyncio
-async def test_get_all_risk_triggers(client: AsyncClient, create_risk_trigger):
-    await create_risk_trigger(name="active_trigger_1", is_active=True)
-    await create_risk_trigger(name="inactive_trigger_1", is_active=False)
+async def test_create_risk_triggers_batch_skips_existing(client: AsyncClient, create_risk_trigger):
+    await create_risk_trigger(name="batch_existing_trigger")
+    response = await client.post("/sentinela/triggers:batch", json=[
+        {
+            "name": "batch_existing_trigger",
+            "description": "Already there.",
+            "trigger_type": "score_threshold",
+            "score_threshold": 0.1,
+            "risk_level": "HIGH",
+        },
+        {
+            "name": "batch_new_trigger",
+            "description": "Brand new.",
+            "trigger_type": "flag_presence",
+            "flag_name": "some_flag",
+            "risk_level": "MEDIUM",
+        },
+    ])
+    assert response.status_code == 201
+    assert response.json() == {"created": ["batch_new_trigger"], "skipped": ["batch_existing_trigger"]}
+
+    response = await client.get("/sentinela/triggers/batch_new_trigger")
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_get_all_risk_triggers(client: AsyncClient, seed_triggers):
     response = await client.get("/sentinela/triggers")
     assert response.status_code == 200
-    assert any(t["name"] == "active_trigger_1" for t in response.json())
-    assert not any(t["name"] == "inactive_trigger_1" for t in response.json())
+    body = response.json()
+    assert any(t["name"] == "active_trigger_1" for t in body)
+    assert not any(t["name"] == "inactive_trigger_1" for t in body)
 
 
 @pytest.mark.asyncio
-async def test_get_risk_trigger_by_name(client: AsyncClient, create_risk_trigger):
-    trigger = await create_risk_trigger(name="get_by_name_trigger")
-    response = await client.get(f"/sentinela/triggers/{trigger.name}")
+async def test_get_risk_trigger_by_name(client: AsyncClient, seed_triggers):
+    response = await client.get("/sentinela/triggers/get_by_name_trigger")
     assert response.status_code == 200
-    assert response.json()["name"] == trigger.name
+    assert response.json()["name"] == "get_by_name_trigger"
 
 
 @pytest.mark.asyncio
@@ -55,8 +89,9 @@ async def test_update_risk_trigger(client: AsyncClient, create_risk_trigger):
     update_data = {"description": "Updated description for risk trigger.", "is_active": False}
     response = await client.put(f"/sentinela/triggers/{trigger.name}", json=update_data)
     assert response.status_code == 200
-    assert response.json()["description"] == "Updated description for risk trigger."
-    assert response.json()["is_active"] is False
+    body = response.json()
+    assert body["description"] == "Updated description for risk trigger."
+    assert body["is_active"] is False
 
 
 @pytest.mark.asyncio
@@ -79,8 +114,6 @@ async def test_delete_risk_trigger(client: AsyncClient, create_risk_trigger):
     trigger = await create_risk_trigger(name="delete_risk_trigger")
     response = await client.delete(f"/sentinela/triggers/{trigger.name}")
     assert response.status_code == 204
-    response = await client.get(f"/sentinela/triggers/{trigger.name}")
-    assert response.status_code == 404
 
 
 @pytest.mark.asyncio
@@ -90,11 +123,11 @@ async def test_delete_risk_trigger_not_found(client: AsyncClient):
 
 
 @pytest.mark.asyncio
-async def test_assess_risk_score_threshold_triggered(client: AsyncClient, create_score_result, create_risk_trigger, faker_instance):
-    entity_id = faker_instance.uuid4()
+async def test_assess_risk_score_threshold_triggered(assess_risk, create_score_result, create_risk_trigger, uuid_factory):
+    entity_id = uuid_factory()
     score_result = await create_score_result(
         entity_id=entity_id,
-        flags=[FlagWithValue(name="negative_impact", value=0.0, weight=1.0)],
+        flags=[_NEG_IMPACT_FLAG],
         metadata={"some_val": 100}
     )
     assert score_result.probability_score < 0.5
@@ -106,23 +139,19 @@ async def test_assess_risk_score_threshold_triggered(client: AsyncClient, create
         risk_level=RiskLevel.CRITICAL,
     )
 
-    response = await client.post("/sentinela/assess", json={
-        "entity_id": entity_id,
-        "score_id": str(score_result.id),
-        "additional_context": {"transaction_id": faker_instance.uuid4()}
-    })
-    result = response.json()
+    response = await assess_risk(entity_id, score_result.id_str, transaction_id=uuid_factory())
     assert response.status_code == 200
+    result = response.json()
     assert result["overall_risk_level"] == RiskLevel.CRITICAL.value
     assert result["triggered_rules"][0]["trigger_name"] == "critical_low_score"
 
 
 @pytest.mark.asyncio
-async def test_assess_risk_flag_presence_triggered(client: AsyncClient, create_score_result, create_risk_trigger, faker_instance):
-    entity_id = faker_instance.uuid4()
+async def test_assess_risk_flag_presence_triggered(assess_risk, create_score_result, create_risk_trigger, uuid_factory):
+    entity_id = uuid_factory()
     score_result = await create_score_result(
         entity_id=entity_id,
-        flags=[FlagWithValue(name="sanctioned_country_flag", value=1.0, weight=1.0, is_active=True)],
+        flags=[_SANCTIONED_FLAG],
         metadata={"country": "SanctionedCountry"}
     )
 
@@ -133,22 +162,19 @@ async def test_assess_risk_flag_presence_triggered(client: AsyncClient, create_s
         risk_level=RiskLevel.HIGH,
     )
 
-    response = await client.post("/sentinela/assess", json={
-        "entity_id": entity_id,
-        "score_id": str(score_result.id),
-    })
-    result = response.json()
+    response = await assess_risk(entity_id, score_result.id_str)
     assert response.status_code == 200
+    result = response.json()
     assert result["overall_risk_level"] == RiskLevel.HIGH.value
     assert result["triggered_rules"][0]["trigger_name"] == "sanction_flag_risk"
 
 
 @pytest.mark.asyncio
-async def test_assess_risk_custom_logic_triggered(client: AsyncClient, create_score_result, create_risk_trigger, faker_instance):
-    entity_id = faker_instance.uuid4()
+async def test_assess_risk_custom_logic_triggered(assess_risk, create_score_result, create_risk_trigger, uuid_factory):
+    entity_id = uuid_factory()
     score_result = await create_score_result(
         entity_id=entity_id,
-        flags=[FlagWithValue(name="default_score", value=0.1, weight=1.0)],
+        flags=[_DEFAULT_SCORE_FLAG],
         metadata={"transaction_count_last_24h": 10}
     )
 
@@ -163,75 +189,68 @@ async def test_assess_risk_custom_logic_triggered(client: AsyncClient, create_sc
         risk_level=RiskLevel.CRITICAL,
     )
 
-    response = await client.post("/sentinela/assess", json={
-        "entity_id": entity_id,
-        "score_id": str(score_result.id),
-        "additional_context": {
-            "user_daily_transactions": 7,
-            "suspicious_keywords_found": True
-        }
-    })
-    result = response.json()
+    response = await assess_risk(
+        entity_id,
+        score_result.id_str,
+        user_daily_transactions=7,
+        suspicious_keywords_found=True,
+    )
     assert response.status_code == 200
+    result = response.json()
     assert result["overall_risk_level"] == RiskLevel.CRITICAL.value
     assert result["triggered_rules"][0]["trigger_name"] == "high_freq_low_score_risk"
 
 
 @pytest.mark.asyncio
-async def test_assess_risk_multiple_triggers_highest_level(client: AsyncClient, create_score_result, create_risk_trigger, faker_instance):
-    entity_id = faker_instance.uuid4()
+async def test_assess_risk_multiple_triggers_highest_level(assess_risk, create_score_result, create_risk_trigger, uuid_factory):
+    entity_id = uuid_factory()
     score_result = await create_score_result(
         entity_id=entity_id,
-        flags=[FlagWithValue(name="is_sanctioned", value=1.0, weight=1.0, is_active=True)],
+        flags=[_IS_SANCTIONED_FLAG],
         metadata={"some_val": 10}
     )
-    await create_risk_trigger(name="medium_score_trigger", score_threshold=score_result.probability_score + 0.01, risk_level=RiskLevel.MEDIUM)
-    await create_risk_trigger(name="critical_flag_trigger", flag_name="is_sanctioned", risk_level=RiskLevel.CRITICAL)
+    await asyncio.gather(
+        create_risk_trigger(name="medium_score_trigger", score_threshold=score_result.probability_score + 0.01, risk_level=RiskLevel.MEDIUM),
+        create_risk_trigger(
+            name="critical_flag_trigger", trigger_type="flag_presence", flag_name="is_sanctioned", risk_level=RiskLevel.CRITICAL
+        ),
+    )
 
-    response = await client.post("/sentinela/assess", json={
-        "entity_id": entity_id,
-        "score_id": str(score_result.id),
-    })
-    result = response.json()
+    response = await assess_risk(entity_id, score_result.id_str)
     assert response.status_code == 200
+    result = response.json()
     assert result["overall_risk_level"] == RiskLevel.CRITICAL.value
     assert len(result["triggered_rules"]) == 2
 
 
-@pytest.mark.asyncio
-async def test_assess_risk_no_triggers(client: AsyncClient, create_score_result, faker_instance):
-    entity_id = faker_instance.uuid4()
-    score_result = await create_score_result(entity_id=entity_id)
-
-    response = await client.post("/sentinela/assess", json={
-        "entity_id": entity_id,
-        "score_id": str(score_result.id),
-        "additional_context": {"transaction_id": "tx123"}
-    })
-    result = response.json()
-    assert response.status_code == 200
-    assert result["overall_risk_level"] == RiskLevel.LOW.value
-    assert len(result["triggered_rules"]) == 0
-
+_MISSING_SCORE_ID = "60a7d9b01c9d440000a7b4c8"
 
-@pytest.mark.asyncio
-async def test_assess_risk_score_not_found(client: AsyncClient, faker_instance):
-    non_existent_score_id = "60a7d9b01c9d440000a7b4c8"
-    response = await client.post("/sentinela/assess", json={
-        "entity_id": faker_instance.uuid4(),
-        "score_id": non_existent_score_id,
-    })
-    assert response.status_code == 404
-    assert f"Score with ID {non_existent_score_id} not found." in response.json()["detail"]
+# (score: "own" = score da própria entidade, "other" = de outra entidade, None = id inexistente;
+#  status esperado, nível de risco esperado, trecho esperado no detail do erro)
+ASSESS_CASES = [
+    pytest.param("own", 200, RiskLevel.LOW, None, id="no_triggers"),
+    pytest.param(None, 404, None, f"Score with ID {_MISSING_SCORE_ID} not found.", id="score_not_found"),
+    pytest.param("other", 400, None, "does not belong to entity", id="mismatched_entity_id"),
+]
 
 
 @pytest.mark.asyncio
-async def test_assess_risk_mismatched_entity_id(client: AsyncClient, create_score_result, faker_instance):
-    score_result = await create_score_result(entity_id=faker_instance.uuid4())
-    wrong_entity_id = faker_instance.uuid4()
-    response = await client.post("/sentinela/assess", json={
-        "entity_id": wrong_entity_id,
-        "score_id": str(score_result.id),
-    })
-    assert response.status_code == 400
-    assert "does not belong to entity" in response.json()["detail"]
+@pytest.mark.parametrize("score_owner,expected_status,expected_level,expected_detail", ASSESS_CASES)
+async def test_assess_risk_without_triggers(
+    assess_risk, create_score_result, uuid_factory, score_owner, expected_status, expected_level, expected_detail
+):
+    entity_id = uuid_factory()
+    if score_owner is None:
+        score_id = _MISSING_SCORE_ID
+    else:
+        score_result = await create_score_result(entity_id=entity_id if score_owner == "own" else uuid_factory())
+        score_id = score_result.id_str
+
+    response = await assess_risk(entity_id, score_id, transaction_id="tx123")
+    assert response.status_code == expected_status
+    result = response.json()
+    if expected_level is not None:
+        assert result["overall_risk_level"] == expected_level.value
+        assert len(result["triggered_rules"]) == 0
+    if expected_detail is not None:
+        assert expected_detail in result["detail"]
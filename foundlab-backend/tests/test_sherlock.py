@@ -1,117 +1,162 @@
+import asyncio
+from datetime import datetime, timedelta
+
 import pytest
 from httpx import AsyncClient
 
-from app.models.sherlock import SanctionStatus, SherlockValidationInput
+from app.models.sherlock import SanctionStatus, SherlockValidationResult
+from app.services.sherlock_service import SherlockService
+
+pytestmark = pytest.mark.usefixtures("clear_database")
+
+
+# Corpos de requisição prontos por entity_type; cada caso só acrescenta o entity_id.
+_WALLET_TEMPLATE = {"entity_type": "wallet_address"}
+_ORG_TEMPLATE = {"entity_type": "organization"}
+_USER_TEMPLATE = {"entity_type": "user_id"}
+_PERSON_TEMPLATE = {"entity_type": "person"}
+_ACCOUNT_TEMPLATE = {"entity_type": "account"}
+
+
+def _has_flag(flag_name: str):
+    return lambda body: any(flag_name in flag["flag_name"] for flag in body["sherlock_flags"])
+
+
+# (entity_id, template do corpo, status esperado, checagem do score, ação sugerida, checagem extra).
+# entity_id None gera um id aleatório "limpo", que não casa com nenhuma lista dos provedores mock.
+VALIDATE_CASES = [
+    pytest.param(
+        None, _WALLET_TEMPLATE, SanctionStatus.CLEAN, lambda score: score < 0.2, "proceed",
+        lambda body: len(body["provider_results"]) == 2 and body["_id"] is not None and not body["sherlock_flags"],
+        id="clean",
+    ),
+    pytest.param(
+        "sanctioned_entity_mock_test", _WALLET_TEMPLATE, SanctionStatus.SANCTIONED, lambda score: score == 1.0, "block",
+        _has_flag("OFAC_SDN_Match"),
+        id="sanctioned_by_chainalysis",
+    ),
+    pytest.param(
+        "cft_listed_example", _ORG_TEMPLATE, SanctionStatus.SANCTIONED, lambda score: score == 0.98, "block",
+        _has_flag("CFT_List_Match"),
+        id="sanctioned_by_trm",
+    ),
+    pytest.param(
+        "ofac_test_wallet", _WALLET_TEMPLATE, SanctionStatus.HIGH_RISK, lambda score: score == 1.0, "review_manual",
+        _has_flag("OFAC_SDN_Match"),
+        id="ofac_hit_scored_high_risk",
+    ),
+    pytest.param(
+        "high_volume_gambling_user", _USER_TEMPLATE, SanctionStatus.HIGH_RISK,
+        lambda score: score == 0.7, "review_manual",
+        lambda body: any(flag["category"] == "AML" and flag["severity"] >= 0.7 for flag in body["sherlock_flags"]),
+        id="high_risk_aml",
+    ),
+    pytest.param(
+        "pep_exposed_politician", _PERSON_TEMPLATE, SanctionStatus.HIGH_RISK,
+        lambda score: score == 0.6, "review_manual",
+        _has_flag("PEP_Exposure"),
+        id="pep_exposed",
+    ),
+    pytest.param(
+        "under_investigation_entity", _ACCOUNT_TEMPLATE, SanctionStatus.UNKNOWN, None, "review_manual",
+        lambda body: (
+            any(p["provider_name"] == "Chainalysis" and p["status"] == "pending" for p in body["provider_results"])
+            and any(p["provider_name"] == "TRM Labs" and p["status"] == "success" for p in body["provider_results"])
+        ),
+        id="pending_status",
+    ),
+]
 
 
 @pytest.mark.asyncio
-async def test_validate_entity_reputation_success(client: AsyncClient, faker_instance):
-    input_data = SherlockValidationInput(
-        entity_id=faker_instance.uuid4() + "_clean_user",
-        entity_type="wallet_address",
-    )
-    response = await client.post("/sherlock/validate", json=input_data.model_dump())
+@pytest.mark.parametrize(
+    "entity_id,template,expected_status,score_check,expected_action,extra_check", VALIDATE_CASES
+)
+async def test_validate_entity_reputation(
+    client: AsyncClient,
+    uuid_factory,
+    entity_id,
+    template,
+    expected_status,
+    score_check,
+    expected_action,
+    extra_check,
+):
+    input_data = {**template, "entity_id": entity_id if entity_id else uuid_factory() + "_clean_user"}
+    response = await client.post("/sherlock/validate", json=input_data)
     assert response.status_code == 200
-    assert response.json()["entity_id"] == input_data.entity_id
-    assert response.json()["overall_sanction_status"] == SanctionStatus.CLEAN.value
-    assert response.json()["overall_risk_score"] < 0.2
-    assert len(response.json()["provider_results"]) == 2
-    assert response.json()["_id"] is not None
-    assert response.json()["suggested_action"] == "proceed"
-    assert len(response.json()["sherlock_flags"]) == 0
+    body = response.json()
+    assert body["entity_id"] == input_data["entity_id"]
+    assert body["overall_sanction_status"] == expected_status.value
+    if score_check is not None:
+        assert score_check(body["overall_risk_score"])
+    assert body["suggested_action"] == expected_action
+    assert extra_check(body)
 
 
 @pytest.mark.asyncio
-async def test_validate_entity_reputation_sanctioned_by_chainalysis(client: AsyncClient, faker_instance):
-    input_data = SherlockValidationInput(
-        entity_id="sanctioned_entity_mock_test",
-        entity_type="wallet_address",
+async def test_get_validation_results_by_entity(client: AsyncClient, create_sherlock_validation_result, uuid_factory):
+    entity_id = uuid_factory() + "_history_entity"
+    # Os dois mais antigos são independentes; o result3 vem depois para continuar sendo o mais recente.
+    await asyncio.gather(
+        create_sherlock_validation_result(entity_id=entity_id, entity_type="wallet_address"),
+        create_sherlock_validation_result(entity_id=entity_id, entity_type="wallet_address"),
     )
-    response = await client.post("/sherlock/validate", json=input_data.model_dump())
-    assert response.status_code == 200
-    assert response.json()["overall_sanction_status"] == SanctionStatus.SANCTIONED.value
-    assert response.json()["overall_risk_score"] == 1.0
-    assert any("OFAC_SDN_Match" in flag["flag_name"] for flag in response.json()["sherlock_flags"])
-    assert response.json()["suggested_action"] == "block"
-
-
-@pytest.mark.asyncio
-async def test_validate_entity_reputation_sanctioned_by_trm(client: AsyncClient, faker_instance):
-    input_data = SherlockValidationInput(
-        entity_id="cft_listed_example",
-        entity_type="organization",
-    )
-    response = await client.post("/sherlock/validate", json=input_data.model_dump())
-    assert response.status_code == 200
-    assert response.json()["overall_sanction_status"] == SanctionStatus.SANCTIONED.value
-    assert response.json()["overall_risk_score"] == 0.98
-    assert any("CFT_List_Match" in flag["flag_name"] for flag in response.json()["sherlock_flags"])
-    assert response.json()["suggested_action"] == "block"
-
+    result3 = await create_sherlock_validation_result(entity_id=entity_id, entity_type="wallet_address")
 
-@pytest.mark.asyncio
-async def test_validate_entity_reputation_high_risk_aml(client: AsyncClient, faker_instance):
-    input_data = SherlockValidationInput(
-        entity_id="high_volume_gambling_user",
-        entity_type="user_id",
-    )
-    response = await client.post("/sherlock/validate", json=input_data.model_dump())
+    response = await client.get(f"/sherlock/{entity_id}")
     assert response.status_code == 200
-    assert response.json()["overall_sanction_status"] == SanctionStatus.HIGH_RISK.value
-    assert response.json()["overall_risk_score"] == 0.7
-    assert any(flag["category"] == "AML" and flag["severity"] >= 0.7 for flag in response.json()["sherlock_flags"])
-    assert response.json()["suggested_action"] == "review_manual"
-
+    results = response.json()
+    assert len(results) == 3
+    assert all(r["entity_id"] == entity_id for r in results)
 
-@pytest.mark.asyncio
-async def test_validate_entity_reputation_pep_exposed(client: AsyncClient, faker_instance):
-    input_data = SherlockValidationInput(
-        entity_id="pep_exposed_politician",
-        entity_type="person",
-    )
-    response = await client.post("/sherlock/validate", json=input_data.model_dump())
-    assert response.status_code == 200
-    assert response.json()["overall_sanction_status"] == SanctionStatus.HIGH_RISK.value
-    assert response.json()["overall_risk_score"] == 0.6
-    assert any("PEP_Exposure" in flag["flag_name"] for flag in response.json()["sherlock_flags"])
-    assert response.json()["suggested_action"] == "review_manual"
+    created_at_dates = [r["created_at"] for r in results]
+    assert created_at_dates == sorted(created_at_dates, reverse=True)
+    assert results[0]["_id"] == str(result3.id)
 
 
 @pytest.mark.asyncio
-async def test_validate_entity_reputation_pending_status(client: AsyncClient, faker_instance):
-    input_data = SherlockValidationInput(
-        entity_id="under_investigation_entity",
-        entity_type="account",
-    )
-    response = await client.post("/sherlock/validate", json=input_data.model_dump())
+async def test_get_validation_results_by_entity_no_results(client: AsyncClient, uuid_factory):
+    entity_id = uuid_factory() + "_no_history"
+    response = await client.get(f"/sherlock/{entity_id}")
     assert response.status_code == 200
-    assert response.json()["overall_sanction_status"] == SanctionStatus.UNKNOWN.value
-    assert response.json()["suggested_action"] == "review_manual"
-    assert any(p["provider_name"] == "Chainalysis" and p["status"] == "pending" for p in response.json()["provider_results"])
-    assert any(p["provider_name"] == "TRM Labs" and p["status"] == "success" for p in response.json()["provider_results"])
+    assert len(response.json()) == 0
 
 
 @pytest.mark.asyncio
-async def test_get_validation_results_by_entity(client: AsyncClient, create_sherlock_validation_result, faker_instance):
-    entity_id = faker_instance.uuid4() + "_history_entity"
-    result1 = await create_sherlock_validation_result(entity_id=entity_id, entity_type="wallet_address")
-    result2 = await create_sherlock_validation_result(entity_id=entity_id, entity_type="wallet_address")
-    result3 = await create_sherlock_validation_result(entity_id=entity_id, entity_type="wallet_address")
+async def test_get_validation_results_by_entity_streams_multiple_batches(client: AsyncClient, uuid_factory):
+    """The streamed array stays well-formed and ordered across more than one cursor batch (batch_size=200)."""
+    entity_id = uuid_factory() + "_long_history"
+    base_time = datetime.utcnow().replace(microsecond=0)  # o BSON guarda datas com precisão de milissegundos
+    docs = [
+        SherlockValidationResult(
+            entity_id=entity_id,
+            entity_type="wallet_address",
+            overall_sanction_status=SanctionStatus.CLEAN,
+            overall_risk_score=0.0,
+            created_at=base_time + timedelta(seconds=i),
+        ).model_dump(by_alias=True, exclude={"id"})
+        for i in range(250)
+    ]
+    await SherlockService().validation_results_collection.insert_many(docs)
 
     response = await client.get(f"/sherlock/{entity_id}")
     assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
     results = response.json()
-    assert len(results) == 3
-    assert all(r["entity_id"] == entity_id for r in results)
-
-    created_at_dates = [r["created_at"] for r in results]
-    assert all(created_at_dates[i] >= created_at_dates[i + 1] for i in range(len(created_at_dates) - 1))
-    assert results[0]["_id"] == str(result3.id)
+    assert len(results) == 250
+    assert results[0]["created_at"] == (base_time + timedelta(seconds=249)).isoformat()
+    assert results[-1]["created_at"] == base_time.isoformat()
 
 
 @pytest.mark.asyncio
-async def test_get_validation_results_by_entity_no_results(client: AsyncClient, faker_instance):
-    entity_id = faker_instance.uuid4() + "_no_history"
-    response = await client.get(f"/sherlock/{entity_id}")
-    assert response.status_code == 200
-    assert len(response.json()) == 0
+async def test_get_validation_results_by_entity_query_error_returns_500(client: AsyncClient, monkeypatch):
+    """A cursor that fails before the first result still gets a 500, since streaming has not started yet."""
+    async def _failing_iter(self, entity_id):
+        raise RuntimeError("cursor exploded")
+        yield  # pragma: no cover - torna a função um gerador assíncrono
+
+    monkeypatch.setattr(SherlockService, "iter_validation_results_by_entity_id", _failing_iter)
+    response = await client.get("/sherlock/any_entity")
+    assert response.status_code == 500
+    assert "cursor exploded" in response.json()["detail"]
@@ -1,20 +1,25 @@
+import hashlib
+import io
+
 import pytest
+import pytest_asyncio
 import httpx
 import logging
-import json
+import orjson
 import uuid
 
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.routing import APIRouter
 
 # Import the middleware and context variables
+from app.middleware import pii
 from app.middleware.request_context_middleware import (
+    JsonBytesStreamHandler,
     RequestContextMiddleware,
     request_id_context,
     decision_id_context,
     use_case_context,
-    REQUESTS_PROCESSED_COUNT # Import the counter for potential future tests
 )
 
 # Configure logging for testing
@@ -25,20 +30,20 @@ logger = logging.getLogger(__name__)
 test_router = APIRouter()
 
 @test_router.get("/test-context")
-async def test_context():
+async def read_context():
     # Access context variables within the endpoint
     req_id = request_id_context.get()
     dec_id = decision_id_context.get()
     uc = use_case_context.get()
     logger.info("Inside test_context endpoint", extra={"req_id": req_id, "dec_id": dec_id, "use_case": uc})
-    return JSONResponse({
+    return ORJSONResponse({
         "request_id_from_context": req_id,
         "decision_id_from_context": dec_id,
         "use_case_from_context": uc,
     })
 
 @test_router.post("/test-decision")
-async def test_decision():
+async def decision():
     # Simulate setting a DecisionID and UseCase in the service layer
     test_decision_id = str(uuid.uuid4())
     test_use_case = "test_decision_use_case"
@@ -56,7 +61,56 @@ async def test_decision():
     decision_id_context.reset(decision_id_token)
     use_case_context.reset(use_case_token)
 
-    return JSONResponse({"status": "ok"})
+    return ORJSONResponse({"status": "ok"})
+
+@test_router.post("/test-decision-context")
+async def decision_context():
+    # Simulate the service layer setting DecisionID/UseCase and leaving them for the middleware.
+    # No reset here: the middleware runs the app in a per-request Context, so nothing leaks across requests.
+    test_decision_id = str(uuid.uuid4())
+    decision_id_context.set(test_decision_id)
+    use_case_context.set("test_context_use_case")
+    return ORJSONResponse({"decision_id": test_decision_id})
+
+@test_router.post("/test-decision-with-state")
+async def decision_with_state(request: Request): # Needs the Request object to set state
+    test_decision_id = str(uuid.uuid4())
+    test_use_case = "test_state_use_case"
+    test_entity_id = "test_entity_123"
+    test_score_before = 0.5
+    test_score_after = 0.7
+    test_flags = ["FLAG_A", "FLAG_B"]
+
+    # Set contextvars (for potential logging within endpoint/service)
+    decision_id_token = decision_id_context.set(test_decision_id)
+    use_case_token = use_case_context.set(test_use_case)
+
+    # Set request.state.audit (for middleware to capture in end log)
+    request.state.audit = {
+        "use_case": test_use_case,
+        "entity_id": test_entity_id,
+        "score_before": test_score_before,
+        "score_after": test_score_after,
+        "flags_triggered": test_flags,
+    }
+
+    logger.info("Inside test_decision_with_state endpoint, setting state")
+
+    # Reset contextvars
+    decision_id_context.reset(decision_id_token)
+    use_case_context.reset(use_case_token)
+
+    return ORJSONResponse({"status": "ok"})
+
+@test_router.post("/test-audit-numbers")
+async def audit_numbers(request: Request):
+    # Numbers that a line-level card/phone regex would corrupt, next to a string value that must be masked
+    request.state.audit = {
+        "entity_id": "bob@example.com",
+        "score_after": 5 / 7,
+        "requested_at_ms": 1760000000000,
+    }
+    return ORJSONResponse({"status": "ok"})
 
 
 # Define a test FastAPI app with the middleware
@@ -64,20 +118,62 @@ test_app = FastAPI()
 test_app.add_middleware(RequestContextMiddleware)
 test_app.include_router(test_router)
 
-# Helper to parse JSON logs
-def parse_log_message(log_entry: str) -> dict:
-    # Assuming logs are single-line JSON objects
+# Same routes behind the middleware in "fused" log mode (single request.end per request)
+fused_test_app = FastAPI()
+fused_test_app.add_middleware(RequestContextMiddleware, log_mode="fused")
+fused_test_app.include_router(test_router)
+
+# Build the middleware chains up front instead of lazily on each app's first request
+for _app in (test_app, fused_test_app):
+    _app.middleware_stack = _app.build_middleware_stack()
+
+@pytest.fixture(scope="session", autouse=True)
+def _configure_logging():
+    # Configure INFO capture once for the whole session instead of caplog.set_level in every test
+    root_logger = logging.getLogger()
+    previous_level = root_logger.level
+    root_logger.setLevel(logging.INFO)
+    yield
+    root_logger.setLevel(previous_level)
+
+@pytest_asyncio.fixture(scope="session")
+async def client():
+    transport = httpx.ASGITransport(app=test_app, raise_app_exceptions=True)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
+
+@pytest_asyncio.fixture(scope="session")
+async def fused_client():
+    transport = httpx.ASGITransport(app=fused_test_app, raise_app_exceptions=True)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
+
+# Helper to extract the audit event from a captured log record
+def parse_log_message(record: logging.LogRecord) -> dict:
+    # The middleware attaches the event dict to the record; JSON rendering only happens on the listener thread
+    payload = getattr(record, "event_payload", None)
+    if payload is not None:
+        return payload
+    # Fallback for records whose message is a single-line JSON object
     try:
-        return json.loads(log_entry)
-    except json.JSONDecodeError:
-        pytest.fail(f"Log entry is not valid JSON: {log_entry}")
+        return orjson.loads(record.getMessage())
+    except orjson.JSONDecodeError:
+        pytest.fail(f"Log entry is not valid JSON: {record.getMessage()}")
+
+# Helper to bin middleware records by event name in a single pass
+def _by_event(records: list[logging.LogRecord]) -> dict[str, list[logging.LogRecord]]:
+    out: dict[str, list[logging.LogRecord]] = {}
+    for rec in records:
+        for event in ("request.start", "request.end"):
+            if event in rec.message:
+                out.setdefault(event, []).append(rec)
+    return out
 
 # --- Test Cases ---
 
 @pytest.mark.asyncio
-async def test_middleware_adds_request_id_header():
-    async with httpx.AsyncClient(app=test_app, base_url="http://test") as client:
-        response = await client.get("/test-context")
+async def test_middleware_adds_request_id_header(client):
+    response = await client.get("/test-context")
 
     assert response.status_code == 200
     assert "x-request-id" in response.headers
@@ -85,19 +181,17 @@ async def test_middleware_adds_request_id_header():
     assert "x-decision-id" not in response.headers
 
 @pytest.mark.asyncio
-async def test_middleware_preserves_provided_request_id_header():
+async def test_middleware_preserves_provided_request_id_header(client):
     provided_request_id = str(uuid.uuid4())
-    async with httpx.AsyncClient(app=test_app, base_url="http://test") as client:
-        response = await client.get("/test-context", headers={"X-Request-ID": provided_request_id})
+    response = await client.get("/test-context", headers={"X-Request-ID": provided_request_id})
 
     assert response.status_code == 200
     assert "x-request-id" in response.headers
     assert response.headers["x-request-id"] == provided_request_id
 
 @pytest.mark.asyncio
-async def test_context_vars_are_accessible_in_endpoint(caplog):
-    async with httpx.AsyncClient(app=test_app, base_url="http://test") as client:
-        response = await client.get("/test-context")
+async def test_context_vars_are_accessible_in_endpoint(client, caplog):
+    response = await client.get("/test-context")
 
     assert response.status_code == 200
     response_data = response.json()
@@ -126,34 +220,24 @@ async def test_context_vars_are_accessible_in_endpoint(caplog):
     # More specific log content checks require JSON formatter setup for tests
 
 @pytest.mark.asyncio
-async def test_middleware_generates_structured_logs(caplog):
-    caplog.set_level(logging.INFO) # Ensure INFO logs are captured
-
-    async with httpx.AsyncClient(app=test_app, base_url="http://test") as client:
-        response = await client.get("/test-context")
+async def test_middleware_generates_structured_logs(client, caplog):
+    response = await client.get("/test-context")
 
     assert response.status_code == 200
 
-    # Filter logs generated by the middleware (look for "request.start" and "request.end")
-    middleware_logs = [rec for rec in caplog.records if "request.start" in rec.message or "request.end" in rec.message]
-
-    assert len(middleware_logs) >= 2 # Expect at least start and end logs
+    # Bin logs generated by the middleware by event ("request.start" and "request.end")
+    logs_by_event = _by_event(caplog.records)
 
-    start_log = next((rec for rec in middleware_logs if "request.start" in rec.message), None)
-    end_log = next((rec for rec in middleware_logs if "request.end" in rec.message), None)
+    # Expect at least start and end logs
+    assert "request.start" in logs_by_event
+    assert "request.end" in logs_by_event
 
-    assert start_log is not None
-    assert end_log is not None
+    start_log = logs_by_event["request.start"][0]
+    end_log = logs_by_event["request.end"][0]
 
-    # Assuming the JsonFormatter from logging_config is applied for tests
-    # This part needs the JsonFormatter to be used by the logger
-    # We'll manually parse the message for this test for now, assuming the format is like the print in middleware
-    # For a real test, configure logging with the JsonFormatter before running tests
-
-    # Manual parsing based on the print(json.dumps(log_event)) from the middleware code
-    # This is a temporary approach until JsonFormatter is integrated with test logger
-    start_log_data = parse_log_message(start_log.message) # The print is the message here
-    end_log_data = parse_log_message(end_log.message) # The print is the message here
+    # The middleware logs the event name as the message and the event dict as `event_payload`
+    start_log_data = parse_log_message(start_log)
+    end_log_data = parse_log_message(end_log)
 
     # Validate start log schema and content
     assert start_log_data["event"] == "request.start"
@@ -196,86 +280,39 @@ async def test_middleware_generates_structured_logs(caplog):
     assert end_log_data["use_case"] == "undefined" # Default if not set
 
 @pytest.mark.asyncio
-async def test_middleware_captures_set_context_vars_in_logs(caplog):
-    caplog.set_level(logging.INFO)
-
-    async with httpx.AsyncClient(app=test_app, base_url="http://test") as client:
-        response = await client.post("/test-decision") # Call endpoint that sets context
+async def test_middleware_captures_set_context_vars_in_logs(client, caplog):
+    response = await client.post("/test-decision") # Call endpoint that sets context
 
     assert response.status_code == 200
 
-    # Filter logs generated by the middleware
-    middleware_logs = [rec for rec in caplog.records if "request.start" in rec.message or "request.end" in rec.message]
+    # Bin logs generated by the middleware by event
+    logs_by_event = _by_event(caplog.records)
 
-    assert len(middleware_logs) >= 2
+    assert "request.start" in logs_by_event
+    assert "request.end" in logs_by_event
 
-    end_log = next((rec for rec in middleware_logs if "request.end" in rec.message), None)
-    assert end_log is not None
+    end_log = logs_by_event["request.end"][0]
 
-    end_log_data = parse_log_message(end_log.message)
+    end_log_data = parse_log_message(end_log)
 
-    # Check if DecisionID and UseCase from contextvars were captured in the end log
-    # The test endpoint sets them directly in contextvars, so middleware should see them
-    # Note: This requires the middleware to access contextvars OR state AFTER call_next
-    # The current middleware code attempts to get from request.state AFTER call_next.
-    # The test_decision endpoint sets contextvars, NOT state.
-    # We need to reconcile how use_case/decision_id are propagated.
-    # If middleware generates DecisionID and service sets use_case/entity_id in state,
-    # then middleware should capture use_case/entity_id from state.
-    # DecisionID propagation needs refinement.
-
-    # Let's test the DecisionID generated by the middleware and the default UseCase/EntityID first
+    # /test-decision resets its contextvars before returning, so the end log falls back to
+    # the DecisionID generated by the middleware and the default UseCase/EntityID
     assert end_log_data["decision_id"] is not None # Middleware generates this
     assert end_log_data["use_case"] == "undefined" # Default
     assert end_log_data["entity_id"] == "unknown" # Default
 
-    # To test contextvar propagation from endpoint/service, we'd need to adjust
-    # how middleware reads them OR how the endpoint/service injects them (state vs contextvar).
-    # The middleware currently tries to read use_case/entity_id from state.
-    # The test_decision endpoint sets contextvars. This is a mismatch.
-
-    # Let's adjust the test_decision endpoint to also set state to match the middleware expectation
-    @test_router.post("/test-decision-with-state")
-    async def test_decision_with_state(request: Request): # Need Request object to set state
-         test_decision_id = str(uuid.uuid4())
-         test_use_case = "test_state_use_case"
-         test_entity_id = "test_entity_123"
-         test_score_before = 0.5
-         test_score_after = 0.7
-         test_flags = ["FLAG_A", "FLAG_B"]
-
-         # Set contextvars (for potential logging within endpoint/service)
-         decision_id_token = decision_id_context.set(test_decision_id)
-         use_case_token = use_case_context.set(test_use_case)
-
-         # Set request.state (for middleware to capture in end log)
-         request.state.use_case = test_use_case
-         request.state.entity_id = test_entity_id
-         request.state.score_before = test_score_before
-         request.state.score_after = test_score_after
-         request.state.flags_triggered = test_flags
-
-         logger.info("Inside test_decision_with_state endpoint, setting state")
-
-         # Reset contextvars
-         decision_id_context.reset(decision_id_token)
-         use_case_context.reset(use_case_token)
-
-         return JSONResponse({"status": "ok"})
-
-    # Now test the endpoint that sets state
+    # Now test the endpoint that sets request.state.audit
     caplog.clear() # Clear previous logs
-    async with httpx.AsyncClient(app=test_app, base_url="http://test") as client:
-        response = await client.post("/test-decision-with-state")
+    response = await client.post("/test-decision-with-state")
 
     assert response.status_code == 200
 
-    middleware_logs_state = [rec for rec in caplog.records if "request.start" in rec.message or "request.end" in rec.message]
-    assert len(middleware_logs_state) >= 2
-    end_log_state = next((rec for rec in middleware_logs_state if "request.end" in rec.message), None)
-    assert end_log_state is not None
+    logs_by_event_state = _by_event(caplog.records)
+    assert "request.start" in logs_by_event_state
+    assert "request.end" in logs_by_event_state
+    end_log_state = logs_by_event_state["request.end"][0]
 
-    end_log_state_data = parse_log_message(end_log_state.message)
+    end_log_state_data = parse_log_message(end_log_state)
 
     # Validate that state data was captured in the end log
     assert end_log_state_data["use_case"] == "test_state_use_case"
@@ -284,8 +321,189 @@ async def test_middleware_captures_set_context_vars_in_logs(caplog):
     assert end_log_state_data["score_after"] == 0.7
     assert end_log_state_data["flags_triggered"] == ["FLAG_A", "FLAG_B"]
 
+@pytest.mark.asyncio
+async def test_middleware_sees_context_vars_set_in_endpoint(client, caplog):
+    response = await client.post("/test-decision-context")
+
+    assert response.status_code == 200
+    decision_id = response.json()["decision_id"]
+    assert response.headers["x-decision-id"] == decision_id
+
+    logs_by_event = _by_event(caplog.records)
+    assert "request.end" in logs_by_event
+    end_log = logs_by_event["request.end"][0]
+
+    end_log_data = parse_log_message(end_log)
+    assert end_log_data["decision_id"] == decision_id
+    assert end_log_data["use_case"] == "test_context_use_case"
+
+    # The values stay inside that request's Context
+    assert decision_id_context.get() == "-"
+    assert use_case_context.get() == "unknown"
+
+@pytest.mark.asyncio
+async def test_middleware_fused_log_mode(fused_client, caplog):
+    response = await fused_client.get("/test-context")
+
+    assert response.status_code == 200
+
+    logs_by_event = _by_event(caplog.records)
+    assert "request.start" not in logs_by_event
+    assert len(logs_by_event["request.end"]) == 1
+
+    fused_log_data = parse_log_message(logs_by_event["request.end"][0])
+    assert fused_log_data["event"] == "request.end"
+    assert "latency_ms" in fused_log_data
+    assert fused_log_data["start"]["path"] == "/test-context"
+    assert fused_log_data["start"]["request_id"] == fused_log_data["request_id"]
+
+@pytest.mark.asyncio
+async def test_fused_log_mode_masks_start_once(fused_client, caplog, monkeypatch):
+    # Count how often the captured body goes through the PII regex (the marker survives masking)
+    masked_bodies = []
+    real_mask = pii.mask
+
+    def counting_mask(text: str) -> str:
+        if text.startswith('{"fused_marker"'):
+            masked_bodies.append(text)
+        return real_mask(text)
+
+    monkeypatch.setattr(pii, "mask", counting_mask)
+    body = b'{"fused_marker": "alice@example.com"}' + b" " * 5000
+    response = await fused_client.post("/test-decision", content=body)
+
+    assert response.status_code == 200
+    assert len(masked_bodies) == 1
+
+    fused_log_data = parse_log_message(_by_event(caplog.records)["request.end"][0])
+    assert fused_log_data["start"]["truncated_body"].startswith('{"fused_marker": "[REDACTED:email]"}')
+
+    # The embedded start is covered by the signature like the rest of the event
+    signed = {k: v for k, v in fused_log_data.items() if k != "veritas_signature"}
+    expected_signature = hashlib.sha256(orjson.dumps(signed, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    assert fused_log_data["veritas_signature"] == expected_signature
+
+@pytest.mark.asyncio
+async def test_pii_masked_in_logs(client, caplog):
+    # Padded past the 5000-byte limit: declared-small bodies are not captured, only sized
+    body = b'{"email": "alice@example.com", "card": "4111111111111111", "phone": "+55 11 91234-5678"}' + b" " * 5000
+    response = await client.post("/test-decision", content=body)
+
+    assert response.status_code == 200
+
+    logs_by_event = _by_event(caplog.records)
+    assert "request.start" in logs_by_event
+    start_log = logs_by_event["request.start"][0]
+
+    rendered = orjson.dumps(start_log.event_payload).decode()
+    assert "alice@example.com" not in rendered
+    assert "4111111111111111" not in rendered
+    assert "+55 11 91234-5678" not in rendered
+    assert "[REDACTED:email]" in rendered
+    assert "[REDACTED:card]" in rendered
+    assert "[REDACTED:phone]" in rendered
+
+    # Masking keeps the line valid JSON and leaves non-PII fields intact
+    rendered_data = orjson.loads(rendered)
+    assert rendered_data["request_id"] == response.headers["x-request-id"]
+    assert rendered_data["body_size"] == len(body)
+
+@pytest.mark.asyncio
+async def test_body_truncation_no_copy_small(client, caplog):
+    response = await client.post("/test-decision", content=b"x" * 512)
+
+    assert response.status_code == 200
+
+    logs_by_event = _by_event(caplog.records)
+    assert "request.start" in logs_by_event
+    start_log = logs_by_event["request.start"][0]
+
+    start_log_data = parse_log_message(start_log)
+    assert start_log_data["truncated_body"] is None
+    assert start_log_data["body_size"] == 512
+    assert start_log_data["body_truncated"] is False
+
+@pytest.mark.asyncio
+async def test_body_truncation_large(client, caplog):
+    response = await client.post("/test-decision", content=b"x" * 6000)
+
+    assert response.status_code == 200
+
+    logs_by_event = _by_event(caplog.records)
+    assert "request.start" in logs_by_event
+    start_log = logs_by_event["request.start"][0]
+
+    start_log_data = parse_log_message(start_log)
+    assert start_log_data["truncated_body"] == "x" * 5000
+    assert start_log_data["body_size"] == 6000
+    assert start_log_data["body_truncated"] is True
+
+@pytest.mark.asyncio
+async def test_pii_masking_keeps_numbers_and_signature(client, caplog):
+    response = await client.post("/test-audit-numbers")
+
+    assert response.status_code == 200
+
+    logs_by_event = _by_event(caplog.records)
+    assert "request.end" in logs_by_event
+
+    rendered_data = orjson.loads(orjson.dumps(logs_by_event["request.end"][0].event_payload))
+    assert rendered_data["entity_id"] == "[REDACTED:email]"
+    assert rendered_data["score_after"] == 5 / 7
+    assert rendered_data["requested_at_ms"] == 1760000000000
+
+    # The signature is computed over the masked event, so it verifies from the emitted line alone
+    signed = {k: v for k, v in rendered_data.items() if k != "veritas_signature"}
+    expected_signature = hashlib.sha256(orjson.dumps(signed, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    assert rendered_data["veritas_signature"] == expected_signature
+
+@pytest.mark.asyncio
+async def test_stdout_handler_writes_masked_json_bytes(client, caplog):
+    body = b'{"email": "alice@example.com"}' + b" " * 5000
+    response = await client.post("/test-decision", content=body)
+
+    assert response.status_code == 200
+
+    logs_by_event = _by_event(caplog.records)
+    assert "request.start" in logs_by_event
+
+    # Emit the captured record through the handler class used for stdout, on a private in-memory stream
+    handler = JsonBytesStreamHandler(io.BytesIO())
+    handler.handle(logs_by_event["request.start"][0])
+
+    raw = handler.stream.getvalue()
+    assert raw.endswith(b"\n")
+    assert raw.count(b"\n") == 1
+    assert b"alice@example.com" not in raw
+    start_line = orjson.loads(raw)
+    assert start_line["event"] == "request.start"
+    assert start_line["request_id"] == response.headers["x-request-id"]
+    assert start_line["truncated_body"].startswith('{"email": "[REDACTED:email]"}')
+
+@pytest.mark.asyncio
+async def test_body_buffer_pool_does_not_grow(caplog):
+    # A private middleware instance, so draining its pool does not affect the shared test apps
+    pool_app = FastAPI()
+    pool_app.include_router(test_router)
+    middleware = RequestContextMiddleware(pool_app)
+    pooled_buffers = [middleware._buf_pool.get_nowait() for _ in range(middleware._buf_pool.qsize())]
+
+    transport = httpx.ASGITransport(app=middleware)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        # Empty pool: the request falls back to a one-off buffer that is dropped afterwards
+        response = await c.post("/test-decision", content=b"y" * 6000)
+        assert response.status_code == 200
+        assert middleware._buf_pool.qsize() == 0
+
+        # A pooled buffer is handed back once the body is captured
+        middleware._buf_pool.put(pooled_buffers[0])
+        response = await c.post("/test-decision", content=b"z" * 6000)
+        assert response.status_code == 200
+        assert middleware._buf_pool.qsize() == 1
+
+    start_logs = [parse_log_message(rec) for rec in _by_event(caplog.records)["request.start"]]
+    assert [log["truncated_body"] for log in start_logs] == ["y" * 5000, "z" * 5000]
+
 
-# TODO: Add tests for PII masking in logs (requires JsonFormatter integration)
 # TODO: Add tests for Veritas signature calculation (requires JsonFormatter/middleware print output check)
-# TODO: Add tests for body truncation
-# TODO: Add tests for middleware heartbeat check (requires health endpoint and middleware counter)
\ No newline at end of file
+# TODO: Add tests for middleware heartbeat check (requires health endpoint and middleware counter)